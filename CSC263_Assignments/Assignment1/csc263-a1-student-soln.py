@@ -1,16 +1,58 @@
-from typing import List, Dict, Tuple, Optional, Callable
+import asyncio
+import array
+import contextlib
+import csv
+import gc
+import heapq
+import math
+import json
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, List, Dict, Set, Tuple, Optional, Callable, Iterable, Iterator, Awaitable
+
+# Binary snapshot layout: magic, format version, CRC-32 of everything after
+# the header, vertex count, edge count, name blob size, reserved.
+SNAPSHOT_MAGIC = b"A1GRAPH\0"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIqqqq")
+
 class Vertex:
     """
     Represents a vertex in a graph.
 
+    Vertices use __slots__ and store each edge only as child name -> weight,
+    the source being the vertex itself; names are interned. The documented
+    (source, child, weight) tuples are built on demand by children,
+    get_children and Graph.get_edge.
+
     Attributes:
         name (str): The label or identifier of the vertex.
-        children (Dict[str, Tuple[str, str, float]]): 
+        weights (Dict[str, float]): A mapping between child vertex names and edge weights.
+        children (MutableMapping[str, Tuple[str, str, float]]): 
             A mapping between child vertex names and edges.
             Each edge is represented as a tuple:
                 (source vertex name, child vertex name, edge weight).
+            This is a view over weights, so writes to it update weights.
+            Once the vertex is in a graph, writes go through that graph's
+            add_edge and remove_edge, so its indexes and caches stay current.
+        graph (Optional[Graph]): The graph the vertex was last added to, if any.
     """
 
+    __slots__ = ("name", "weights", "graph")
+
     def __init__(self, name: str, children: Optional[Dict[str, Tuple[str, str, float]]] = None):
         """
         Initializes a Vertex.
@@ -20,8 +62,28 @@ class Vertex:
             children (Optional[Dict[str, Tuple[str, str, float]]]): 
                 A mapping between child vertex names and edges.
         """
-        self.name = name
-        self.children: Dict[str, Tuple[str, str, float]] = children if children is not None else {}
+        self.name = sys.intern(name)
+        self.weights: Dict[str, float] = {}
+        self.graph: Optional[Graph] = None
+        if children is not None:
+            self.children = children
+
+    @property
+    def children(self) -> "EdgeView":
+        """
+        Returns a mapping between child vertex names and (source, child, weight) edges.
+        """
+        return EdgeView(self)
+
+    @children.setter
+    def children(self, children: Dict[str, Tuple[str, str, float]]) -> None:
+        if self.graph is None:
+            self.weights = {sys.intern(v): edge[2] for v, edge in children.items()}
+            return
+        for v in [v for v in self.weights if v not in children]:
+            self.graph.remove_edge(self.name, v)
+        for v, edge in children.items():
+            self.graph.add_edge(self.name, v, edge[2])
 
     def get_children(self) -> List[Tuple[str, str, float]]:
         """
@@ -30,21 +92,85 @@ class Vertex:
         Returns:
             List[Tuple[str, str, float]]: The list of edges from this vertex.
         """
-        kids = []
-        keys = []
-        for key in self.children:
-            keys.append(key)
-        for i in range(len(self.children)):
-            kids.append(self.children[keys[i]])
+        name = self.name
+        return [(name, v, w) for v, w in self.weights.items()]
+
+
+class EdgeView(MutableMapping):
+    """
+    A dict-like view of a vertex's edges that builds (source, child, weight)
+    tuples on demand from Vertex.weights.
+    """
+
+    __slots__ = ("vertex",)
+
+    def __init__(self, vertex: Vertex):
+        """
+        Initializes an EdgeView.
+
+        Args:
+            vertex (Vertex): The vertex whose edges are viewed.
+        """
+        self.vertex = vertex
+
+    def __getitem__(self, v_name: str) -> Tuple[str, str, float]:
+        return (self.vertex.name, v_name, self.vertex.weights[v_name])
+
+    def __setitem__(self, v_name: str, edge: Tuple[str, str, float]) -> None:
+        if self.vertex.graph is None:
+            self.vertex.weights[sys.intern(v_name)] = edge[2]
+        else:
+            self.vertex.graph.add_edge(self.vertex.name, v_name, edge[2])
+
+    def __delitem__(self, v_name: str) -> None:
+        if self.vertex.graph is None:
+            del self.vertex.weights[v_name]
+        elif self.vertex.graph.remove_edge(self.vertex.name, v_name) is None:
+            raise KeyError(v_name)
+
+    def __contains__(self, v_name: object) -> bool:
+        return v_name in self.vertex.weights
+
+    def __iter__(self):
+        return iter(self.vertex.weights)
+
+    def __len__(self) -> int:
+        return len(self.vertex.weights)
 
-        return kids
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
 
 class Graph:
     """
     Represents a graph consisting of multiple vertices.
 
+    Alongside the edges, the graph keeps a reverse adjacency index (child name
+    -> parent name -> weight), updated in O(1) by every edge change made
+    through the Graph methods. It answers parents, in_degree and
+    reverse_neighbours without scanning the edges. Writes through
+    Vertex.children are routed to these methods too; only direct writes to
+    Vertex.weights go unnoticed by the index, version and path_cache.
+
+    The reverse index stores every edge a second time, so it costs about as
+    much memory as the adjacency itself: benchmark_memory(20000, 200000)
+    measures about 16 MB for the graph, against about 9 MB without the
+    reverse index and 22 MB for the original tuple-per-edge layout.
+
     Attributes:
         vertices (List[Vertex]): The list of vertices in the graph.
+        index (Dict[str, Vertex]): A mapping between vertex names and vertices,
+            kept in sync with vertices so that lookups by name are O(1).
+            Vertices appended to or removed from the list directly are picked
+            up on the next lookup, but a vertex replaced in place
+            (vertices[i] = other) is not; use remove_vertices and add_vertex
+            to replace one.
+        version (int): A counter bumped on every change made through the Graph
+            methods, used to tell whether derived data is still current.
+        path_cache (Optional[PathCache]): If set, shortest path trees computed
+            on this graph are memoized in it, and repaired in place when an
+            edge is added, re-weighted or removed.
+        landmarks (Optional[LandmarkIndex]): The landmark distances built by
+            preprocess_landmarks, if any.
     """
 
     def __init__(self, vertices: List[Vertex]):
@@ -54,6 +180,48 @@ class Graph:
             vertices (List[Vertex]): The list of vertices that make up the graph.
         """
         self.vertices = vertices
+        self.index: Dict[str, Vertex] = {}
+        self.version = 0
+        self.path_cache: Optional[PathCache] = None
+        self.landmarks: Optional[LandmarkIndex] = None
+        self._reachability: Optional[ReachabilityIndex] = None
+        self._parents: Dict[str, Dict[str, float]] = {}
+        self._indexed = 0
+        self._reindex()
+
+    def _reindex(self) -> None:
+        """
+        Rebuilds the name and reverse adjacency indexes from the vertex list.
+        Only needed when a caller appended to self.vertices directly instead of
+        going through add_vertex. If several vertices share a name, the first
+        one is indexed.
+        """
+        self._indexed = len(self.vertices)
+        self.index = {}
+        for vertex in self.vertices:
+            self.index.setdefault(vertex.name, vertex)
+        self._parents = {}
+        for vertex in self.index.values():
+            vertex.graph = self
+            self._link_parents(vertex)
+        self.version += 1
+
+    def _sync_index(self) -> None:
+        """
+        Reindexes if self.vertices has grown or shrunk since it was last
+        indexed, i.e. if a caller changed the list directly. Only the length
+        is compared, so that every lookup stays O(1): a vertex replaced in
+        place stays unnoticed until the length next changes.
+        """
+        if len(self.vertices) != self._indexed:
+            self._reindex()
+
+    def _link_parents(self, vertex: Vertex) -> None:
+        """
+        Adds the edges out of a vertex to the reverse adjacency index.
+        """
+        for v, w in vertex.weights.items():
+            self._parents.setdefault(v, {})[vertex.name] = w
 
     def get_vertices(self) -> List[Vertex]:
         """
@@ -64,6 +232,60 @@ class Graph:
         """
         return self.vertices
 
+    def get_vertex(self, name: str) -> Optional[Vertex]:
+        """
+        Looks up a vertex by name.
+
+        Args:
+            name (str): The name of the vertex.
+
+        Returns:
+            Optional[Vertex]: The vertex with that name, or None if it is not in the graph.
+        """
+        self._sync_index()
+        return self.index.get(name)
+
+    def add_vertex(self, vertex: Vertex) -> Vertex:
+        """
+        Inserts a vertex into the graph, unless a vertex with the same name is
+        already present.
+
+        Args:
+            vertex (Vertex): The vertex to insert.
+
+        Returns:
+            Vertex: The vertex stored in the graph under that name.
+        """
+        existing = self.get_vertex(vertex.name)
+        if existing is not None:
+            return existing
+        self.vertices.append(vertex)
+        self._indexed += 1
+        self.index[vertex.name] = vertex
+        vertex.graph = self
+        self._link_parents(vertex)
+        self.version += 1
+        if self.path_cache is not None:
+            # A vertex without edges cannot change any cheapest path.
+            self.path_cache.advance(self.version - 1, self.version)
+        return vertex
+
+    def ensure_vertex(self, name: str) -> Vertex:
+        """
+        Returns the vertex with the given name, inserting an empty one if the
+        graph does not have it yet.
+
+        Args:
+            name (str): The name of the vertex.
+
+        Returns:
+            Vertex: The vertex stored in the graph under that name.
+        """
+        vertex = self.get_vertex(name)
+        if vertex is None:
+            vertex = self.add_vertex(Vertex(name))
+        return vertex
+
     def is_child(self, u_name: str, v_name: str) -> bool:
         """
         Checks if vertex v_name is a child of vertex u_name.
@@ -75,17 +297,8 @@ class Graph:
         Returns:
             bool: True if the vertex v_name is a child of the vertex u_name, False otherwise.
         """
-        kids = []
-        for i in range(len(self.vertices)):
-            #print(self.get_vertices()[i].name)
-            if self.get_vertices()[i].name == u_name:
-                kids = self.get_vertices()[i].get_children()
-                #print(kids)
-
-                for kid in kids:
-                    if kid[1] == v_name:
-                        return True
-        return False
+        vertex = self.get_vertex(u_name)
+        return vertex is not None and v_name in vertex.weights
 
     def get_edge(self, u_name: str, v_name: str) -> Optional[Tuple[str, str, float]]:
         """
@@ -99,177 +312,3514 @@ class Graph:
             Optional[Tuple[str, str, float]]: The edge if it exists,
             or None if no such edge is found.
         """
-        if not self.is_child(u_name, v_name):
+        vertex = self.get_vertex(u_name)
+        if vertex is None or v_name not in vertex.weights:
             return None
-        kids = []
-        for i in range(len(self.vertices)):
-            if self.get_vertices()[i].name == u_name:
-                kids = self.get_vertices()[i].get_children()
+        return (vertex.name, v_name, vertex.weights[v_name])
 
-                for kid in kids:
-                    if kid[1] == v_name:
-                        return kid
+    def add_edge(self, u_name: str, v_name: str, weight: float) -> Tuple[str, str, float]:
+        """
+        Inserts or replaces the edge from u_name to v_name, adding either
+        vertex to the graph if it is missing.
 
+        Args:
+            u_name (str): The name of the parent vertex.
+            v_name (str): The name of the child vertex.
+            weight (float): The edge weight.
 
-class Device(Vertex):
-    """
-    Represents a network device, extending the Vertex class with
-    device-specific functionality.
+        Returns:
+            Tuple[str, str, float]: The stored edge.
+        """
+        vertex = self.ensure_vertex(u_name)
+        v_name = self.ensure_vertex(v_name).name
+        old_weight = vertex.weights.get(v_name)
+        if old_weight != weight:
+            vertex.weights[v_name] = weight
+            self._parents.setdefault(v_name, {})[vertex.name] = weight
+            self._edge_changed(vertex.name, v_name, old_weight, weight)
+        return (vertex.name, v_name, weight)
 
-    Attributes:
-        name (str): The label or identifier of the device.
-        children (Dict[str, Tuple[str, str, float]]):
-            A mapping between child device names and nearby devices.
-        network (Graph): A graph representing this device's discovered network.
-    """
+    def update_edge(self, u_name: str, v_name: str, weight: float) -> Tuple[str, str, float]:
+        """
+        Changes the weight of the existing edge from u_name to v_name. Cached
+        shortest path trees are repaired rather than recomputed.
+
+        Args:
+            u_name (str): The name of the parent vertex.
+            v_name (str): The name of the child vertex.
+            weight (float): The new edge weight.
+
+        Returns:
+            Tuple[str, str, float]: The edge as it was before the update.
 
-    def __init__(self, name: str):
+        Raises:
+            KeyError: If there is no edge from u_name to v_name.
         """
-        Initializes a Device.
+        vertex = self.get_vertex(u_name)
+        if vertex is None or v_name not in vertex.weights:
+            raise KeyError((u_name, v_name))
+        old_weight = vertex.weights[v_name]
+        if old_weight != weight:
+            vertex.weights[v_name] = weight
+            self._parents.setdefault(v_name, {})[vertex.name] = weight
+            self._edge_changed(vertex.name, v_name, old_weight, weight)
+        return (vertex.name, v_name, old_weight)
+
+    def remove_edge(self, u_name: str, v_name: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Removes the edge from u_name to v_name. Both vertices stay in the graph.
 
         Args:
-            name (str): The label or identifier of the device.
+            u_name (str): The name of the parent vertex.
+            v_name (str): The name of the child vertex.
+
+        Returns:
+            Optional[Tuple[str, str, float]]: The removed edge, or None if there
+            was no such edge.
         """
-        self.name = name
-        self.children = {}
-        self.network = Graph([self])
+        vertex = self.get_vertex(u_name)
+        if vertex is None or v_name not in vertex.weights:
+            return None
+        old_weight = vertex.weights.pop(v_name)
+        parents = self._parents.get(v_name)
+        if parents is not None:
+            parents.pop(vertex.name, None)
+            if not parents:
+                del self._parents[v_name]
+        self._edge_changed(vertex.name, v_name, old_weight, None)
+        return (vertex.name, v_name, old_weight)
 
-    def discover_network(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]]) -> None:
+    def _edge_changed(self, u_name: str, v_name: str,
+                      old_weight: Optional[float], new_weight: Optional[float]) -> None:
         """
-        Discovers the surrounding network starting from this device. Once this
-        function is called, self.network should contain a representation of the
-        device's discovered network.
+        Bumps the version after an edge changed and repairs the cached
+        shortest path trees. A weight of None means the edge does not exist.
+        """
+        self.version += 1
+        if self.path_cache is not None:
+            self.path_cache.repair(self, u_name, v_name, old_weight, new_weight, self.version - 1)
+
+    def remove_vertices(self, names: Iterable[str]) -> None:
+        """
+        Removes vertices from the graph together with every edge into or out of them.
 
         Args:
-            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
-                A function that takes an ordered list of device names (i.e., a path)
-                and returns the edges from the last device in the path to its immediate children.
+            names (Iterable[str]): The names of the vertices to remove.
         """
+        doomed = {name for name in names if self.get_vertex(name) is not None}
+        if not doomed:
+            return
+        self.vertices[:] = [vertex for vertex in self.vertices if vertex.name not in doomed]
+        self._indexed = len(self.vertices)
+        for name in doomed:
+            vertex = self.index.pop(name)
+            if vertex.graph is self:
+                vertex.graph = None
+            for v in vertex.weights:
+                parents = self._parents.get(v)
+                if parents is not None:
+                    parents.pop(name, None)
+                    if not parents:
+                        del self._parents[v]
+        for name in doomed:
+            for parent in self._parents.pop(name, {}):
+                if parent not in doomed:
+                    del self.index[parent].weights[name]
+        self.version += 1
 
-        visited = []
-        to_visit = [[self.name]]
+    def neighbours(self, name: str) -> List[Tuple[str, float]]:
+        """
+        Returns the children of a vertex together with the edge weights.
 
-        while len(to_visit) > 0:
-            path = to_visit.pop(0)
-            current = path[-1]
-            edges = find_devices_fn(path)
-            current_vertex = None
+        Args:
+            name (str): The name of the vertex.
 
-            for v in self.network.vertices:
-                if v.name == current:
-                    current_vertex = v
-                    break
+        Returns:
+            List[Tuple[str, float]]: (child vertex name, edge weight) pairs, or an
+            empty list if the vertex is not in the graph.
+        """
+        vertex = self.get_vertex(name)
+        if vertex is None:
+            return []
+        return list(vertex.weights.items())
 
-            if current_vertex is None:
-                current_vertex = Vertex(current)
-                self.network.vertices.append(current_vertex)
+    def reverse_neighbours(self, name: str) -> List[Tuple[str, float]]:
+        """
+        Returns the parents of a vertex together with the edge weights, from
+        the reverse adjacency index.
 
-            for u, v, w in edges:
-                child_vertex = None
-                for vx in self.network.vertices:
-                    if vx.name == v:
-                        child_vertex = vx
-                        break
+        Args:
+            name (str): The name of the vertex.
 
-                if child_vertex is None:
-                    child_vertex = Vertex(v)
-                    self.network.vertices.append(child_vertex)
-                current_vertex.children[v] = (u, v, w)
+        Returns:
+            List[Tuple[str, float]]: (parent vertex name, edge weight) pairs.
+        """
+        self._sync_index()
+        parents = self._parents.get(name)
+        return list(parents.items()) if parents else []
 
-                if v not in visited:
-                    to_visit.append(path + [v])
+    def parents(self, name: str) -> List[Tuple[str, str, float]]:
+        """
+        Returns all edges into a vertex, i.e. the devices that point at it.
 
-            if current not in visited:
-                visited.append(current)
+        Args:
+            name (str): The name of the vertex.
 
+        Returns:
+            List[Tuple[str, str, float]]: The (parent, vertex, weight) edges.
+        """
+        return [(u, name, w) for u, w in self.reverse_neighbours(name)]
 
-    def find_path(self, d_name: str) -> Optional[List[str]]:
+    def in_degree(self, name: str) -> int:
         """
-        Finds the cheapest path from this device to the specified target device 
-        using the Cheapest-First Search (CFS) algorithm.
+        Counts the edges into a vertex.
 
         Args:
-            d_name (str): The name of the destination device.
+            name (str): The name of the vertex.
 
         Returns:
-            Optional[List[str]]: An ordered list of device names representing the path 
-            from this device to the target. If no path exists, returns None.
+            int: The number of parents of the vertex, 0 if it is not in the graph.
         """
-        open_list = [([self.name], 0.0)]
-        cheapest_cost = {}
+        self._sync_index()
+        return len(self._parents.get(name, ()))
 
-        while open_list:
-            least_path, least_cost = open_list[0]
+    def out_degree(self, name: str) -> int:
+        """
+        Counts the edges out of a vertex.
 
-            for path, cost in open_list:
-                if cost < least_cost:
-                    least_path = path
-                    least_cost = cost
+        Args:
+            name (str): The name of the vertex.
 
-            open_list.remove((least_path, least_cost))
+        Returns:
+            int: The number of children of the vertex, 0 if it is not in the graph.
+        """
+        vertex = self.get_vertex(name)
+        return 0 if vertex is None else len(vertex.weights)
 
-            current = least_path[-1]
+    def preprocess_landmarks(self, k: int = 8) -> "LandmarkIndex":
+        """
+        Picks k landmarks and precomputes the cost of the cheapest path from
+        and to each of them, for ALT (A*, landmarks, triangle inequality)
+        route queries. The index is kept in self.landmarks.
 
-            if (current in cheapest_cost) and (cheapest_cost[current] <= least_cost):
-                continue
-            cheapest_cost[current] = least_cost
+        Args:
+            k (int): The number of landmarks.
 
-            if current == d_name:
-                return least_path
+        Returns:
+            LandmarkIndex: The landmark distances.
+        """
+        self.landmarks = LandmarkIndex(self, k)
+        return self.landmarks
 
-            current_vertex = None
-            for v in self.network.vertices:
-                if v.name == current:
-                    current_vertex = v
-                    break
-            if current_vertex is None:
-                continue
+    def reachability(self) -> "ReachabilityIndex":
+        """
+        Returns a reachability index over the graph, building it if the graph
+        has changed since the last one was built.
 
-            for child_name, edge in current_vertex.children.items():
-                _, _, weight = edge
-                new_cost = least_cost + weight
-                new_path = least_path + [child_name]
+        Returns:
+            ReachabilityIndex: The index for the current version of the graph.
+        """
+        if self._reachability is None or self._reachability.version != self.version:
+            self._reachability = ReachabilityIndex(self)
+        return self._reachability
 
-                if (child_name not in cheapest_cost) or (new_cost < cheapest_cost[child_name]):
-                    open_list.append((new_path, new_cost))
+    def current_reachability(self) -> Optional["ReachabilityIndex"]:
+        """
+        Returns the reachability index if one has been built for the current
+        version of the graph, without building one.
 
+        Returns:
+            Optional[ReachabilityIndex]: The index, or None.
+        """
+        if self._reachability is not None and self._reachability.version == self.version:
+            return self._reachability
         return None
 
+    def shortest_path_tree(self, source: str) -> "ShortestPathTree":
+        """
+        Finds the cheapest paths from source to every reachable vertex. If
+        path_cache is set, the tree is served from it while the graph has not
+        changed since it was computed.
 
-# ----------------------------------------------------------------------
-# Mock function for testing
-# ----------------------------------------------------------------------
-def find_devices_fn(path: List[str]) -> List[Tuple[str, str, float]]:
+        Args:
+            source (str): The name of the source vertex.
+
+        Returns:
+            ShortestPathTree: The cheapest path tree rooted at source.
+        """
+        if self.path_cache is not None:
+            tree = self.path_cache.get(source, self.version)
+            if tree is not None:
+                return tree
+        tree = ShortestPathTree(source, *cheapest_first_search(source, self.neighbours))
+        if self.path_cache is not None:
+            self.path_cache.put(tree, self.version)
+        return tree
+
+    def freeze(self) -> "FrozenGraph":
+        """
+        Builds an immutable, array-backed snapshot of the graph for read-heavy
+        queries. Later changes to the graph are not reflected in the snapshot.
+
+        Returns:
+            FrozenGraph: The compressed sparse row form of this graph.
+        """
+        self._sync_index()
+        names = list(self.index)
+        ids = {name: i for i, name in enumerate(names)}
+
+        offsets = array.array("q", [0])
+        targets = array.array("q")
+        weights = array.array("d")
+        for name in names:
+            vertex = self.index[name]
+            for v, w in vertex.weights.items():
+                if v not in ids:
+                    ids[v] = len(names)
+                    names.append(v)
+                targets.append(ids[v])
+                weights.append(w)
+            offsets.append(len(targets))
+
+        # Children that were never inserted as vertices have no edges of their own.
+        offsets.extend([len(targets)] * (len(names) + 1 - len(offsets)))
+        return FrozenGraph(names, offsets, targets, weights)
+
+    def save_snapshot(self, path: str) -> None:
+        """
+        Writes the graph to a binary snapshot file that MappedGraph can open
+        without parsing it. See MappedGraph for the layout.
+
+        Args:
+            path (str): The file to write.
+        """
+        encoded = set()
+        for vertex in self.vertices:
+            encoded.add(vertex.name.encode("utf-8"))
+            encoded.update(v.encode("utf-8") for v in vertex.weights)
+        encoded = sorted(encoded)
+        ids = {name.decode("utf-8"): i for i, name in enumerate(encoded)}
+
+        name_offsets = array.array("q", [0])
+        for name in encoded:
+            name_offsets.append(name_offsets[-1] + len(name))
+        offsets = array.array("q", [0])
+        targets = array.array("q")
+        weights = array.array("d")
+        for name in ids:
+            vertex = self.get_vertex(name)
+            if vertex is not None:
+                targets.extend(ids[v] for v in vertex.weights)
+                weights.extend(vertex.weights.values())
+            offsets.append(len(targets))
+
+        blob = b"".join(encoded)
+        sections = [name_offsets, offsets, targets, weights]
+        if sys.byteorder == "big":
+            for section in sections:
+                section.byteswap()
+        payload = b"".join(section.tobytes() for section in sections) + blob
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, zlib.crc32(payload),
+                                      len(encoded), len(weights), len(blob), 0)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def load_edges(self, path: str, fmt: Optional[str] = None, chunk_size: int = 1 << 20) -> int:
+        """
+        Bulk loads an edge list file into the graph in a single streaming pass.
+
+        A "csv" file has one source,child,weight row per edge, optionally
+        under a header row whose third column is named weight, w or cost. A
+        "jsonl" file has one edge per line, either as a [source, child, weight]
+        array or as an object with "source", "target" and "weight" keys. An
+        edge that is already in the graph, or repeated in the file, takes the
+        last weight read.
+
+        Each edge is inserted straight into the name index, the adjacency and
+        the reverse adjacency, without going through add_edge: the version is
+        bumped once at the end and no per-edge cache repair is done. CSV rows
+        are streamed through the csv module's own buffering; JSON lines are
+        read and decoded chunk_size bytes at a time. Cyclic garbage collection
+        is paused while loading, since the load only allocates objects that
+        stay alive.
+
+        The load is not atomic: if a row is invalid, the edges read before it
+        stay in the graph.
+
+        Args:
+            path (str): The file to read.
+            fmt (Optional[str]): "csv" or "jsonl"; by default, "jsonl" for
+                .jsonl and .ndjson files and "csv" for anything else.
+            chunk_size (int): For "jsonl", roughly how many bytes to read at a time.
+
+        Returns:
+            int: The number of edges read.
+
+        Raises:
+            ValueError: If fmt is unknown or a row is not a valid edge; the
+                message gives the line of the file it is on.
+        """
+        fmt = _edge_list_format(path, fmt)
+        self._sync_index()
+        index = self.index
+        parents = self._parents
+        # name -> [interned name, out weights, in weights], so each endpoint
+        # costs one lookup per edge. The in weights are only looked up or
+        # created once the vertex gets its first parent, so that vertices
+        # without one get no empty entry in the reverse index.
+        slots: Dict[str, List[Any]] = {}
+        get_slot = slots.get
+        count = 0
+
+        def new_slot(name: str) -> List[Any]:
+            vertex = index.get(name)
+            if vertex is None:
+                vertex = Vertex(name)
+                vertex.graph = self
+                self.vertices.append(vertex)
+                self._indexed += 1
+                index[vertex.name] = vertex
+            slot = slots[vertex.name] = [vertex.name, vertex.weights, None]
+            return slot
+
+        def insert(rows: Iterable[Any]) -> None:
+            nonlocal count
+            for row in rows:
+                if type(row) is dict:
+                    row = (row["source"], row["target"], row["weight"])
+                u, v, w = row
+                w = float(w)
+                su = get_slot(u) or new_slot(u)
+                sv = get_slot(v) or new_slot(v)
+                su[1][sv[0]] = w
+                in_weights = sv[2]
+                if in_weights is None:
+                    in_weights = sv[2] = parents.setdefault(sv[0], {})
+                in_weights[su[0]] = w
+                count += 1
+
+        reader = None
+        first_line, lines, chunk_start = 1, [], 0
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                if fmt == "csv":
+                    reader = csv.reader(f)
+                    first = next(reader, None)
+                    header = first is not None and len(first) == 3 and first[2].strip().lower() in ("weight", "w", "cost")
+                    if first is not None and not header:
+                        insert([first])
+                    insert(reader)
+                else:
+                    for first_line, lines in _json_lines_chunks(f, chunk_size):
+                        chunk_start = count
+                        insert(json.loads("[%s]" % ",".join(line for line in lines if not line.isspace())))
+        except (KeyError, TypeError, ValueError) as error:
+            if reader is not None:
+                line = reader.line_num
+            else:
+                line, error = _json_lines_error(lines, first_line, count - chunk_start, error)
+            raise ValueError("%s:%d: not a valid edge: %s" % (path, line, error)) from None
+        finally:
+            if collecting:
+                gc.enable()
+            self.version += 1
+        return count
+
+    def export_edges(self, path: str, fmt: Optional[str] = None, chunk_size: int = 1 << 16) -> int:
+        """
+        Writes every edge of the graph to an edge list file that load_edges
+        can read back, streaming it out: CSV rows go through csv.writer as they
+        are produced, and JSON lines are written chunk_size edges at a time.
+        Vertices without any edge are not written.
+
+        Args:
+            path (str): The file to write.
+            fmt (Optional[str]): "csv" (no header row) or "jsonl" (one
+                [source, child, weight] array per line); by default, chosen
+                from the file extension as in load_edges.
+            chunk_size (int): For "jsonl", how many edges to write at a time.
+
+        Returns:
+            int: The number of edges written.
+
+        Raises:
+            ValueError: If fmt is unknown.
+        """
+        fmt = _edge_list_format(path, fmt)
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                writer = csv.writer(f, lineterminator="\n")
+                for vertex in self.vertices:
+                    name = vertex.name
+                    writer.writerows((name, v, w) for v, w in vertex.weights.items())
+                    count += len(vertex.weights)
+                return count
+
+            quoted = {vertex.name: json.dumps(vertex.name) for vertex in self.vertices}
+            lines = []
+            for vertex in self.vertices:
+                prefix = "[%s," % quoted[vertex.name]
+                for v, w in vertex.weights.items():
+                    target = quoted.get(v) or json.dumps(v)
+                    weight = repr(w) if math.isfinite(w) else json.dumps(w)
+                    lines.append("%s%s,%s]\n" % (prefix, target, weight))
+                    if len(lines) >= chunk_size:
+                        f.writelines(lines)
+                        count += len(lines)
+                        lines.clear()
+            f.writelines(lines)
+            count += len(lines)
+        return count
+
+
+def _edge_list_format(path: str, fmt: Optional[str]) -> str:
     """
-    A mock function that simulates network discovery.
+    Resolves the format of an edge list file for Graph.load_edges and
+    Graph.export_edges.
 
     Args:
-        path (List[str]): The sequence of device names representing the discovery path.
+        path (str): The file name.
+        fmt (Optional[str]): "csv", "jsonl", or None to go by the extension.
 
     Returns:
-        List[Tuple[str, str, float]]: A list of edges, where each tuple contains:
-            - source device name (str),
-            - child device name (str),
-            - edge weight (float).
+        str: "csv" or "jsonl".
+
+    Raises:
+        ValueError: If fmt is unknown.
     """
-    if not path:
-        return []
+    if fmt is None:
+        return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError("unknown edge list format: %r" % fmt)
+    return fmt
 
-    last_device = path[-1]
 
-    mock_network = {
-        "chandra-s25": [
-            ("chandra-s25", "router-051797", 1.0),
-            ("chandra-s25", "helen-pc", 2.0),
-        ],
-        "router-051797": [
-            ("router-051797", "ws-102", 1.2),
-            ("router-051797", "switch-12", 0.8),
-            ("router-051797", "srv-07", 1.0),
-        ],
-        "helen-pc": [
-            ("helen-pc", "ws-14", 1.5),
-        ],
-    }
+def _json_lines_chunks(f: Any, chunk_size: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Reads a JSON-lines file about chunk_size bytes at a time, so that each
+    chunk can be decoded with a single json.loads call.
 
-    return mock_network.get(last_device, [])
+    Args:
+        f (TextIO): The open file.
+        chunk_size (int): Roughly how many bytes to read at a time.
+
+    Yields:
+        Tuple[int, List[str]]: The line number of the first line of a chunk,
+        and the lines of the chunk.
+    """
+    line_number = 1
+    while True:
+        lines = f.readlines(chunk_size)
+        if not lines:
+            return
+        yield line_number, lines
+        line_number += len(lines)
+
+
+def _json_lines_error(lines: List[str], first_line: int, position: int,
+                      error: Exception) -> Tuple[int, Exception]:
+    """
+    Finds the line of a JSON-lines chunk that Graph.load_edges failed on.
+
+    Args:
+        lines (List[str]): The lines of the chunk.
+        first_line (int): The line number of the first line of the chunk.
+        position (int): The number of edges of the chunk inserted before the failure.
+        error (Exception): The error raised.
+
+    Returns:
+        Tuple[int, Exception]: The line number in the file, and the error to
+        report for it.
+    """
+    numbered = [(first_line + i, line) for i, line in enumerate(lines) if not line.isspace()]
+    if isinstance(error, json.JSONDecodeError):
+        # The chunk was decoded as one array; find the line that is not JSON.
+        for line_number, line in numbered:
+            try:
+                json.loads(line)
+            except json.JSONDecodeError as line_error:
+                return line_number, ValueError("%s at column %d" % (line_error.msg, line_error.pos + 1))
+    if position < len(numbered):
+        return numbered[position][0], error
+    return first_line, error
+
+
+class FrozenGraph:
+    """
+    An immutable compressed sparse row (CSR) snapshot of a Graph.
+
+    Vertices are numbered 0..n-1. The edges out of vertex i are
+    targets[offsets[i]:offsets[i + 1]], with the matching weights in the same
+    slice of weights, in the order the original vertex listed its children.
+
+    Attributes:
+        names (List[str]): The name of every vertex, indexed by vertex id.
+        ids (Dict[str, int]): A mapping between vertex names and vertex ids.
+        offsets (Sequence[int]): n + 1 row offsets into targets and weights.
+        targets (Sequence[int]): The child vertex id of every edge.
+        weights (Sequence[float]): The weight of every edge.
+    """
+
+    def __init__(self, names: List[str], offsets, targets, weights):
+        """
+        Initializes a FrozenGraph from already built CSR arrays.
+
+        Args:
+            names (List[str]): The name of every vertex, indexed by vertex id.
+            offsets (Sequence[int]): n + 1 row offsets into targets and weights.
+            targets (Sequence[int]): The child vertex id of every edge.
+            weights (Sequence[float]): The weight of every edge.
+        """
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+    def num_vertices(self) -> int:
+        """
+        Returns the number of vertices in the snapshot.
+        """
+        return len(self.offsets) - 1
+
+    def num_edges(self) -> int:
+        """
+        Returns the number of edges in the snapshot.
+        """
+        return len(self.targets)
+
+    def vertex_id(self, name: str) -> Optional[int]:
+        """
+        Looks up the id of a vertex by name.
+
+        Args:
+            name (str): The name of the vertex.
+
+        Returns:
+            Optional[int]: The vertex id, or None if the vertex is not in the snapshot.
+        """
+        return self.ids.get(name)
+
+    def vertex_name(self, vertex_id: int) -> str:
+        """
+        Looks up the name of a vertex by id.
+
+        Args:
+            vertex_id (int): The id of the vertex.
+
+        Returns:
+            str: The name of the vertex.
+        """
+        return self.names[vertex_id]
+
+    def get_edge(self, u_name: str, v_name: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Retrieves the edge between u_name and v_name.
+
+        Args:
+            u_name (str): The name of the parent vertex.
+            v_name (str): The name of the child vertex.
+
+        Returns:
+            Optional[Tuple[str, str, float]]: The edge if it exists,
+            or None if no such edge is found.
+        """
+        u = self.vertex_id(u_name)
+        v = self.vertex_id(v_name)
+        if u is None or v is None:
+            return None
+        for i in range(self.offsets[u], self.offsets[u + 1]):
+            if self.targets[i] == v:
+                return (u_name, v_name, self.weights[i])
+        return None
+
+    def is_child(self, u_name: str, v_name: str) -> bool:
+        """
+        Checks if vertex v_name is a child of vertex u_name.
+
+        Args:
+            u_name (str): The name of the parent vertex.
+            v_name (str): The name of the potential child vertex.
+
+        Returns:
+            bool: True if the vertex v_name is a child of the vertex u_name, False otherwise.
+        """
+        return self.get_edge(u_name, v_name) is not None
+
+    def neighbours(self, name: str) -> List[Tuple[str, float]]:
+        """
+        Returns the children of a vertex together with the edge weights.
+
+        Args:
+            name (str): The name of the vertex.
+
+        Returns:
+            List[Tuple[str, float]]: (child vertex name, edge weight) pairs, or an
+            empty list if the vertex is not in the snapshot.
+        """
+        u = self.vertex_id(name)
+        if u is None:
+            return []
+        start, end = self.offsets[u], self.offsets[u + 1]
+        name = self.vertex_name
+        return [(name(v), w) for v, w in zip(self.targets[start:end], self.weights[start:end])]
+
+    def find_path(self, s_name: str, d_name: str) -> Optional[List[str]]:
+        """
+        Finds the cheapest path between two vertices with the same
+        Cheapest-First Search as Device.find_path, run directly on vertex ids.
+
+        Args:
+            s_name (str): The name of the source vertex.
+            d_name (str): The name of the destination vertex.
+
+        Returns:
+            Optional[List[str]]: An ordered list of vertex names representing the
+            path from s_name to d_name. If no path exists, returns None.
+        """
+        if s_name == d_name:
+            return [s_name]
+        source = self.vertex_id(s_name)
+        target = self.vertex_id(d_name)
+        if source is None or target is None:
+            return None
+
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        previous = {}
+        tentative = {source: 0.0}
+        frontier = [(0.0, 0, source, -1)]
+        counter = 1
+
+        while frontier:
+            least_cost, _, current, parent = heapq.heappop(frontier)
+            if current in previous:
+                continue
+            previous[current] = parent
+            if current == target:
+                path = []
+                while current != -1:
+                    path.append(self.vertex_name(current))
+                    current = previous[current]
+                path.reverse()
+                return path
+
+            for i in range(offsets[current], offsets[current + 1]):
+                child = targets[i]
+                new_cost = least_cost + weights[i]
+                if child not in tentative or new_cost < tentative[child]:
+                    tentative[child] = new_cost
+                    heapq.heappush(frontier, (new_cost, counter, child, current))
+                    counter += 1
+
+        return None
+
+
+class MappedGraph(FrozenGraph):
+    """
+    A FrozenGraph backed by a memory-mapped snapshot file written by
+    Graph.save_snapshot, so it is queryable as soon as it is opened: the
+    arrays are views straight into the file and names are decoded only when
+    asked for.
+
+    The file is little-endian: the header (see SNAPSHOT_HEADER), then
+    n + 1 int64 name offsets, n + 1 int64 row offsets, m int64 edge targets,
+    m float64 edge weights, and the UTF-8 names back to back. Vertex ids
+    follow the byte order of the encoded names, so a name is found by
+    binary search over the name table.
+
+    Attributes:
+        path (str): The snapshot file.
+        names (List[str]): The name of every vertex, indexed by vertex id;
+            every name is decoded on first access.
+        ids (Dict[str, int]): A mapping between vertex names and vertex ids,
+            built on first access; vertex_id looks names up without it.
+        name_offsets (memoryview): n + 1 offsets of every name in the name blob.
+        offsets (memoryview): n + 1 row offsets into targets and weights.
+        targets (memoryview): The child vertex id of every edge.
+        weights (memoryview): The weight of every edge.
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        """
+        Opens a snapshot file.
+
+        Args:
+            path (str): The snapshot file.
+            verify (bool): Whether to check the CRC-32 of the file, which
+                reads all of it once.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version,
+                is truncated, or fails the checksum.
+        """
+        if sys.byteorder != "little":
+            raise ValueError("graph snapshots can only be mapped on little-endian machines")
+        self.path = path
+        self._names: Optional[List[str]] = None
+        self._ids: Optional[Dict[str, int]] = None
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        self._views = [view]
+        try:
+            if len(view) < SNAPSHOT_HEADER.size:
+                raise ValueError("%s is too short to be a graph snapshot" % path)
+            magic, version, checksum, n, m, blob_size, _ = SNAPSHOT_HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("%s is not a graph snapshot" % path)
+            if version != SNAPSHOT_VERSION:
+                raise ValueError("unsupported graph snapshot version %d" % version)
+            start = SNAPSHOT_HEADER.size
+            if len(view) != start + 8 * (2 * n + 2 + 2 * m) + blob_size:
+                raise ValueError("%s is truncated" % path)
+            if verify and zlib.crc32(view[start:]) != checksum:
+                raise ValueError("%s fails its checksum" % path)
+
+            sections = []
+            for count, code in ((n + 1, "q"), (n + 1, "q"), (m, "q"), (m, "d")):
+                sections.append(view[start:start + 8 * count].cast(code))
+                start += 8 * count
+            self._blob = view[start:]
+            self._views.extend(sections + [self._blob])
+            self.name_offsets, self.offsets, self.targets, self.weights = sections
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> "MappedGraph":
+        """
+        Returns the graph itself, so it is closed at the end of a with block.
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Closes the graph.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """
+        Releases the views and unmaps the file.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def _name_bytes(self, vertex_id: int) -> bytes:
+        """
+        Returns the UTF-8 encoded name of a vertex.
+        """
+        return self._blob[self.name_offsets[vertex_id]:self.name_offsets[vertex_id + 1]].tobytes()
+
+    def vertex_id(self, name: str) -> Optional[int]:
+        """
+        Looks up the id of a vertex by name, by binary search over the name table.
+
+        Args:
+            name (str): The name of the vertex.
+
+        Returns:
+            Optional[int]: The vertex id, or None if the vertex is not in the snapshot.
+        """
+        key = name.encode("utf-8")
+        lo, hi = 0, self.num_vertices()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_vertices() and self._name_bytes(lo) == key:
+            return lo
+        return None
+
+    def vertex_name(self, vertex_id: int) -> str:
+        """
+        Looks up the name of a vertex by id.
+
+        Args:
+            vertex_id (int): The id of the vertex.
+
+        Returns:
+            str: The name of the vertex.
+        """
+        return self._name_bytes(vertex_id).decode("utf-8")
+
+    @property
+    def names(self) -> List[str]:
+        """
+        Returns the name of every vertex, decoding the whole name table the
+        first time it is asked for.
+        """
+        if self._names is None:
+            self._names = [self.vertex_name(i) for i in range(self.num_vertices())]
+        return self._names
+
+    @property
+    def ids(self) -> Dict[str, int]:
+        """
+        Returns the mapping between vertex names and vertex ids, building it
+        the first time it is asked for.
+        """
+        if self._ids is None:
+            self._ids = {name: i for i, name in enumerate(self.names)}
+        return self._ids
+
+
+# ----------------------------------------------------------------------
+# Cheapest-first search engine
+# ----------------------------------------------------------------------
+def cheapest_first_search(source: str,
+                          neighbours: Callable[[str], Iterable[Tuple[str, float]]],
+                          targets: Optional[Iterable[str]] = None,
+                          previous: Optional[Dict[str, Optional[str]]] = None,
+                          max_cost: Optional[float] = None
+                          ) -> Tuple[Dict[str, float], Dict[str, Optional[str]]]:
+    """
+    Runs a Cheapest-First Search (Dijkstra) from source on a binary heap.
+
+    Stale heap entries are skipped when popped instead of being removed, and
+    each vertex only remembers its predecessor, so paths are rebuilt on demand
+    with build_path. Entries of equal cost are popped in insertion order, which
+    matches the order the original list-based search chose them in. Edge
+    weights are assumed to be non-negative.
+
+    Args:
+        source (str): The name of the vertex the search starts from.
+        neighbours (Callable[[str], Iterable[Tuple[str, float]]]):
+            A function that takes a vertex name and returns its
+            (child vertex name, edge weight) pairs.
+        targets (Optional[Iterable[str]]): If given, the search stops as soon
+            as every one of these vertices has been settled.
+        previous (Optional[Dict[str, Optional[str]]]): A dict to record the
+            predecessors in. A vertex's predecessor is recorded before its
+            neighbours are requested, so neighbours may rebuild its path.
+        max_cost (Optional[float]): If given, the search stops before settling
+            the first vertex whose cheapest path costs more than this.
+
+    Returns:
+        Tuple[Dict[str, float], Dict[str, Optional[str]]]: The cost of every
+        settled vertex and its predecessor on the cheapest path (None for source).
+    """
+    cost: Dict[str, float] = {}
+    if previous is None:
+        previous = {}
+    tentative = {source: 0.0}
+    frontier = [(0.0, 0, source, None)]
+    pending = set(targets) if targets is not None else None
+    counter = 1
+
+    while frontier:
+        least_cost, _, current, parent = heapq.heappop(frontier)
+        if current in cost:
+            continue
+        if max_cost is not None and least_cost > max_cost:
+            break
+        cost[current] = least_cost
+        previous[current] = parent
+
+        if pending is not None:
+            pending.discard(current)
+            if not pending:
+                break
+
+        for child, weight in neighbours(current):
+            new_cost = least_cost + weight
+            if child not in tentative or new_cost < tentative[child]:
+                tentative[child] = new_cost
+                heapq.heappush(frontier, (new_cost, counter, child, current))
+                counter += 1
+
+    return cost, previous
+
+
+def a_star_search(source: str, target: str,
+                  neighbours: Callable[[str], Iterable[Tuple[str, float]]],
+                  heuristic: Callable[[str, str], float],
+                  previous: Optional[Dict[str, Optional[str]]] = None
+                  ) -> Tuple[Dict[str, float], Dict[str, Optional[str]]]:
+    """
+    Runs an A* search from source to target on a binary heap.
+
+    Vertices are popped in order of cost so far plus heuristic(vertex, target).
+    The heuristic must be admissible (never overestimate the remaining cost)
+    for the returned path to be the cheapest; a vertex is re-expanded if a
+    cheaper path to it turns up later, so it does not need to be consistent.
+
+    Args:
+        source (str): The name of the vertex the search starts from.
+        target (str): The name of the vertex the search stops at.
+        neighbours (Callable[[str], Iterable[Tuple[str, float]]]):
+            A function that takes a vertex name and returns its
+            (child vertex name, edge weight) pairs.
+        heuristic (Callable[[str, str], float]): A lower bound on the cost of
+            the cheapest path from its first argument to its second.
+        previous (Optional[Dict[str, Optional[str]]]): A dict to record the
+            predecessors in, as for cheapest_first_search.
+
+    Returns:
+        Tuple[Dict[str, float], Dict[str, Optional[str]]]: The cost of every
+        expanded vertex and its predecessor on the cheapest path found to it.
+    """
+    cost: Dict[str, float] = {}
+    if previous is None:
+        previous = {}
+    tentative = {source: 0.0}
+    frontier = [(heuristic(source, target), 0, 0.0, source, None)]
+    counter = 1
+
+    while frontier:
+        _, _, least_cost, current, parent = heapq.heappop(frontier)
+        if least_cost > tentative[current] or (current in cost and cost[current] <= least_cost):
+            continue
+        cost[current] = least_cost
+        previous[current] = parent
+        if current == target:
+            break
+
+        for child, weight in neighbours(current):
+            new_cost = least_cost + weight
+            if child not in tentative or new_cost < tentative[child]:
+                tentative[child] = new_cost
+                heapq.heappush(frontier, (new_cost + heuristic(child, target), counter, new_cost, child, current))
+                counter += 1
+
+    return cost, previous
+
+
+def bidirectional_search(source: str, target: str,
+                         neighbours: Callable[[str], Iterable[Tuple[str, float]]],
+                         reverse_neighbours: Callable[[str], Iterable[Tuple[str, float]]]
+                         ) -> Tuple[Optional[List[str]], int]:
+    """
+    Runs a bidirectional Dijkstra search: one search forward from source and
+    one backward from target along reversed edges, always advancing the side
+    with the cheaper frontier, until no path through the frontiers can beat
+    the cheapest meeting point found so far.
+
+    Args:
+        source (str): The name of the vertex the search starts from.
+        target (str): The name of the vertex the search ends at.
+        neighbours (Callable[[str], Iterable[Tuple[str, float]]]):
+            A function that returns the (child vertex name, edge weight) pairs of a vertex.
+        reverse_neighbours (Callable[[str], Iterable[Tuple[str, float]]]):
+            A function that returns the (parent vertex name, edge weight) pairs of a vertex.
+
+    Returns:
+        Tuple[Optional[List[str]], int]: The cheapest path from source to target
+        (None if there is none) and the number of vertices settled by both sides.
+    """
+    if source == target:
+        return [source], 1
+
+    expand = (neighbours, reverse_neighbours)
+    tentative: Tuple[Dict[str, float], Dict[str, float]] = ({source: 0.0}, {target: 0.0})
+    previous: Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]] = ({source: None}, {target: None})
+    settled: Tuple[Set[str], Set[str]] = (set(), set())
+    frontiers = ([(0.0, 0, source)], [(0.0, 0, target)])
+    best = math.inf
+    meeting = None
+    counter = 1
+
+    while frontiers[0] and frontiers[1]:
+        if frontiers[0][0][0] + frontiers[1][0][0] >= best:
+            break
+        side = 0 if frontiers[0][0][0] <= frontiers[1][0][0] else 1
+        least_cost, _, current = heapq.heappop(frontiers[side])
+        if current in settled[side]:
+            continue
+        settled[side].add(current)
+
+        other = tentative[1 - side]
+        for child, weight in expand[side](current):
+            new_cost = least_cost + weight
+            if child not in tentative[side] or new_cost < tentative[side][child]:
+                tentative[side][child] = new_cost
+                previous[side][child] = current
+                heapq.heappush(frontiers[side], (new_cost, counter, child))
+                counter += 1
+                if child in other and new_cost + other[child] < best:
+                    best = new_cost + other[child]
+                    meeting = child
+
+    settled_count = len(settled[0]) + len(settled[1])
+    if meeting is None:
+        return None, settled_count
+    path = build_path(previous[0], meeting)
+    path.extend(reversed(build_path(previous[1], meeting)[:-1]))
+    return path, settled_count
+
+
+def coordinate_heuristic(coordinates: Dict[str, Tuple[float, float]],
+                         scale: float = 1.0) -> Callable[[str, str], float]:
+    """
+    Builds an A* heuristic from known device coordinates: the straight-line
+    distance between two devices times scale. It is admissible when every
+    edge weighs at least scale times the distance between its endpoints.
+    Devices without coordinates get a bound of 0.
+
+    Args:
+        coordinates (Dict[str, Tuple[float, float]]): The (x, y) position of each device.
+        scale (float): The minimum cost per unit of distance.
+
+    Returns:
+        Callable[[str, str], float]: The heuristic.
+    """
+    def heuristic(v_name: str, d_name: str) -> float:
+        if v_name not in coordinates or d_name not in coordinates:
+            return 0.0
+        (x1, y1), (x2, y2) = coordinates[v_name], coordinates[d_name]
+        return scale * math.hypot(x1 - x2, y1 - y2)
+
+    return heuristic
+
+
+def hop_heuristic(graph: "Graph") -> Callable[[str, str], float]:
+    """
+    Builds an A* heuristic from hop counts: the fewest hops from a vertex to
+    the target times the smallest edge weight in the graph, which is always
+    admissible. The hop counts to a target are computed by one backward
+    breadth-first search the first time that target is asked for, and kept
+    for as long as the graph does not change. That search, and the scan of
+    every edge for the smallest weight after each change, cost more than a
+    plain Cheapest-First Search, so the heuristic only pays off over many
+    queries to the same targets on an unchanged graph.
+
+    Args:
+        graph (Graph): The graph the heuristic is used on.
+
+    Returns:
+        Callable[[str, str], float]: The heuristic.
+    """
+    hops: Dict[str, Dict[str, int]] = {}
+    state = {"version": None, "min_weight": 0.0}
+
+    def heuristic(v_name: str, d_name: str) -> float:
+        if state["version"] != graph.version:
+            hops.clear()
+            weights = [w for vertex in graph.vertices for w in vertex.weights.values()]
+            state["min_weight"] = max(min(weights, default=0.0), 0.0)
+            state["version"] = graph.version
+        if d_name not in hops:
+            distance = {d_name: 0}
+            to_visit = deque([d_name])
+            while to_visit:
+                current = to_visit.popleft()
+                for parent, _ in graph.reverse_neighbours(current):
+                    if parent not in distance:
+                        distance[parent] = distance[current] + 1
+                        to_visit.append(parent)
+            hops[d_name] = distance
+        if v_name not in hops[d_name]:
+            # The target cannot be reached from v_name at all.
+            return math.inf
+        return hops[d_name][v_name] * state["min_weight"]
+
+    return heuristic
+
+
+def build_path(previous: Dict[str, Optional[str]], target: str) -> List[str]:
+    """
+    Rebuilds the path to target from a predecessor map.
+
+    Args:
+        previous (Dict[str, Optional[str]]): The predecessor of every settled
+            vertex, as returned by cheapest_first_search.
+        target (str): The name of a settled vertex.
+
+    Returns:
+        List[str]: The ordered list of vertex names from the source to target.
+    """
+    path = []
+    current: Optional[str] = target
+    while current is not None:
+        path.append(current)
+        current = previous[current]
+    path.reverse()
+    return path
+
+
+class ShortestPathTree:
+    """
+    The cheapest paths from one source vertex to every vertex settled by a
+    Cheapest-First Search.
+
+    Attributes:
+        source (str): The name of the source vertex.
+        cost (Dict[str, float]): The cost of the cheapest path to every vertex in the tree.
+        previous (Dict[str, Optional[str]]): The predecessor of every vertex in
+            the tree (None for source).
+    """
+
+    def __init__(self, source: str, cost: Dict[str, float], previous: Dict[str, Optional[str]]):
+        """
+        Initializes a ShortestPathTree.
+
+        Args:
+            source (str): The name of the source vertex.
+            cost (Dict[str, float]): The cost of every vertex in the tree.
+            previous (Dict[str, Optional[str]]): The predecessor of every vertex in the tree.
+        """
+        self.source = source
+        self.cost = cost
+        self.previous = previous
+        self._children: Optional[Dict[str, Set[str]]] = None
+
+    def __contains__(self, name: str) -> bool:
+        """
+        Checks if a vertex is reachable from the source.
+        """
+        return name in self.cost
+
+    def path_to(self, name: str) -> Optional[List[str]]:
+        """
+        Returns the cheapest path from the source to a vertex.
+
+        Args:
+            name (str): The name of the destination vertex.
+
+        Returns:
+            Optional[List[str]]: An ordered list of vertex names from the source
+            to name, or None if name is not reachable.
+        """
+        if name not in self.cost:
+            return None
+        return build_path(self.previous, name)
+
+    def cost_to(self, name: str) -> Optional[float]:
+        """
+        Returns the cost of the cheapest path from the source to a vertex.
+
+        Args:
+            name (str): The name of the destination vertex.
+
+        Returns:
+            Optional[float]: The path cost, or None if name is not reachable.
+        """
+        return self.cost.get(name)
+
+    def _link(self, name: str, cost: float, parent: Optional[str]) -> None:
+        """
+        Sets the cost and tree parent of a vertex, keeping the child sets in step.
+        """
+        children = self._children
+        old_parent = self.previous.get(name)
+        if old_parent is not None:
+            children[old_parent].discard(name)
+        self.cost[name] = cost
+        self.previous[name] = parent
+        if parent is not None:
+            children.setdefault(parent, set()).add(name)
+
+    def repair(self, graph: Graph, u_name: str, v_name: str,
+               old_weight: Optional[float], new_weight: Optional[float]) -> None:
+        """
+        Updates the tree after the edge u_name -> v_name of graph changed from
+        old_weight to new_weight (None meaning no edge), touching only the
+        vertices whose cheapest path changes.
+
+        A cheaper edge re-settles the vertices it improves, outwards from
+        v_name. A dearer or removed tree edge detaches the subtree below
+        v_name, seeds each detached vertex with its cheapest edge from the
+        rest of the tree, and re-settles the subtree from there. Costs are
+        always exact, but where several paths tie, the tree may keep a
+        different one than a fresh search would pick.
+
+        Args:
+            graph (Graph): The graph, already holding the new edge weight.
+            u_name (str): The name of the parent vertex of the edge.
+            v_name (str): The name of the child vertex of the edge.
+            old_weight (Optional[float]): The weight before the change.
+            new_weight (Optional[float]): The weight after the change.
+        """
+        if u_name not in self.cost:
+            return
+        if self._children is None:
+            self._children = {}
+            for name, parent in self.previous.items():
+                if parent is not None:
+                    self._children.setdefault(parent, set()).add(name)
+        cost = self.cost
+        counter = 0
+
+        if new_weight is not None and (old_weight is None or new_weight < old_weight):
+            candidate = cost[u_name] + new_weight
+            if v_name in cost and candidate >= cost[v_name]:
+                return
+            self._link(v_name, candidate, u_name)
+            frontier = [(candidate, v_name)]
+            while frontier:
+                least_cost, current = heapq.heappop(frontier)
+                if least_cost > cost[current]:
+                    continue
+                for child, weight in graph.neighbours(current):
+                    new_cost = least_cost + weight
+                    if child not in cost or new_cost < cost[child]:
+                        self._link(child, new_cost, current)
+                        heapq.heappush(frontier, (new_cost, child))
+            return
+
+        if old_weight is None or self.previous.get(v_name) != u_name:
+            return
+
+        affected = []
+        stack = [v_name]
+        while stack:
+            current = stack.pop()
+            affected.append(current)
+            stack.extend(self._children.pop(current, ()))
+        self._children[u_name].discard(v_name)
+        for name in affected:
+            del cost[name]
+            del self.previous[name]
+
+        frontier = []
+        for name in affected:
+            for parent, weight in graph.reverse_neighbours(name):
+                if parent in cost:
+                    frontier.append((cost[parent] + weight, counter, name, parent))
+                    counter += 1
+        heapq.heapify(frontier)
+        detached = set(affected)
+
+        while frontier:
+            least_cost, _, current, parent = heapq.heappop(frontier)
+            if current in cost:
+                continue
+            self._link(current, least_cost, parent)
+            for child, weight in graph.neighbours(current):
+                if child in detached and child not in cost:
+                    heapq.heappush(frontier, (least_cost + weight, counter, child, current))
+                    counter += 1
+
+
+class PathCache:
+    """
+    A bounded, least recently used memo of shortest path trees, keyed by source.
+
+    Every tree is stored with the Graph.version it was computed at, and a
+    lookup at any other version is treated as a miss and drops the entry, so
+    a change to the graph never serves a stale route. Edge changes made
+    through the Graph methods repair the cached trees in place and move them
+    to the new version instead (see ShortestPathTree.repair).
+
+    Attributes:
+        max_size (int): The maximum number of trees kept.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that found no current tree.
+    """
+
+    def __init__(self, max_size: int = 64):
+        """
+        Initializes a PathCache.
+
+        Args:
+            max_size (int): The maximum number of trees kept.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._trees: "OrderedDict[str, Tuple[int, ShortestPathTree]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of cached trees.
+        """
+        return len(self._trees)
+
+    def get(self, source: str, version: int) -> Optional[ShortestPathTree]:
+        """
+        Looks up the tree rooted at source.
+
+        Args:
+            source (str): The name of the source vertex.
+            version (int): The current version of the graph.
+
+        Returns:
+            Optional[ShortestPathTree]: The cached tree, or None if there is no
+            tree for source computed at this version.
+        """
+        entry = self._trees.get(source)
+        if entry is None or entry[0] != version:
+            self._trees.pop(source, None)
+            self.misses += 1
+            return None
+        self._trees.move_to_end(source)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tree: ShortestPathTree, version: int) -> None:
+        """
+        Stores a tree, evicting the least recently used one if the cache is full.
+
+        Args:
+            tree (ShortestPathTree): The tree to store.
+            version (int): The version of the graph the tree was computed at.
+        """
+        self._trees[tree.source] = (version, tree)
+        self._trees.move_to_end(tree.source)
+        while len(self._trees) > self.max_size:
+            self._trees.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drops every cached tree.
+        """
+        self._trees.clear()
+
+    def advance(self, old_version: int, new_version: int) -> None:
+        """
+        Marks the trees computed at old_version as still valid at new_version.
+
+        Args:
+            old_version (int): The version before a change that cannot affect any path.
+            new_version (int): The version after the change.
+        """
+        for source, (version, tree) in list(self._trees.items()):
+            if version == old_version:
+                self._trees[source] = (new_version, tree)
+
+    def repair(self, graph: Graph, u_name: str, v_name: str,
+               old_weight: Optional[float], new_weight: Optional[float], old_version: int) -> None:
+        """
+        Repairs the trees computed at old_version after an edge change and
+        moves them to the current graph version; older trees are dropped.
+
+        Args:
+            graph (Graph): The graph, already holding the new edge weight.
+            u_name (str): The name of the parent vertex of the edge.
+            v_name (str): The name of the child vertex of the edge.
+            old_weight (Optional[float]): The weight before the change (None if the edge was new).
+            new_weight (Optional[float]): The weight after the change (None if the edge was removed).
+            old_version (int): The graph version before the change.
+        """
+        for source, (version, tree) in list(self._trees.items()):
+            if version == old_version:
+                tree.repair(graph, u_name, v_name, old_weight, new_weight)
+                self._trees[source] = (graph.version, tree)
+            else:
+                del self._trees[source]
+
+
+class LandmarkIndex:
+    """
+    Landmark distances for ALT route queries on a Graph.
+
+    For every landmark L the index stores d(L, v) and d(v, L) for every vertex
+    v, so by the triangle inequality max(d(L, t) - d(L, v), d(v, L) - d(t, L))
+    is a lower bound on d(v, t). Landmarks are picked one at a time as the
+    vertex farthest from the landmarks picked so far. The bounds are only
+    valid for the graph version the index was built at.
+
+    Attributes:
+        landmarks (List[str]): The names of the landmark vertices.
+        ids (Dict[str, int]): A mapping between vertex names and array positions.
+        from_landmark (List[array.array]): d(L, v) for every landmark, indexed by vertex id.
+        to_landmark (List[array.array]): d(v, L) for every landmark, indexed by vertex id.
+        version (int): The graph version the index was built at.
+        preprocess_seconds (float): How long building the index took.
+    """
+
+    def __init__(self, graph: Graph, k: int):
+        """
+        Builds a LandmarkIndex.
+
+        Args:
+            graph (Graph): The graph to index.
+            k (int): The number of landmarks.
+        """
+        started = time.perf_counter()
+        graph._sync_index()
+        self.version = graph.version
+        # Duplicate names share the id of the vertex the graph indexes.
+        self.ids = {name: i for i, name in enumerate(graph.index)}
+        self.landmarks: List[str] = []
+        self.from_landmark: List[array.array] = []
+        self.to_landmark: List[array.array] = []
+
+        names = list(self.ids)
+        nearest = array.array("d", [math.inf]) * len(names)
+        candidate = names[0] if names else None
+        while candidate is not None and len(self.landmarks) < k:
+            self.landmarks.append(candidate)
+            forward, _ = cheapest_first_search(candidate, graph.neighbours)
+            backward, _ = cheapest_first_search(candidate, graph.reverse_neighbours)
+            self.from_landmark.append(array.array("d", [forward.get(name, math.inf) for name in names]))
+            self.to_landmark.append(array.array("d", [backward.get(name, math.inf) for name in names]))
+
+            candidate, farthest = None, -1.0
+            for i, name in enumerate(names):
+                nearest[i] = min(nearest[i], forward.get(name, math.inf), backward.get(name, math.inf))
+                if nearest[i] > farthest and name not in self.landmarks:
+                    candidate, farthest = name, nearest[i]
+
+        self.preprocess_seconds = time.perf_counter() - started
+
+    def memory_bytes(self) -> int:
+        """
+        Returns the size of the distance arrays in bytes.
+        """
+        return sum(a.itemsize * len(a) for a in self.from_landmark + self.to_landmark)
+
+    def heuristic(self, v_name: str, d_name: str) -> float:
+        """
+        Returns the landmark lower bound on the cost of the cheapest path from
+        v_name to d_name. Can be passed to find_path as an A* heuristic.
+
+        Args:
+            v_name (str): The name of the vertex the path starts from.
+            d_name (str): The name of the destination vertex.
+
+        Returns:
+            float: The lower bound (infinite if d_name cannot be reached from v_name).
+        """
+        v = self.ids.get(v_name)
+        t = self.ids.get(d_name)
+        if v is None or t is None:
+            return 0.0
+        best = 0.0
+        # inf - inf is nan, which never compares greater and so is skipped.
+        for forward, backward in zip(self.from_landmark, self.to_landmark):
+            bound = forward[t] - forward[v]
+            if bound > best:
+                best = bound
+            bound = backward[v] - backward[t]
+            if bound > best:
+                best = bound
+        return best
+
+    def report(self, graph: Graph, queries: List[Tuple[str, str]]) -> Dict[str, float]:
+        """
+        Measures what the index buys on a set of route queries by running each
+        one with plain Dijkstra and with ALT.
+
+        Args:
+            graph (Graph): The graph the index was built on.
+            queries (List[Tuple[str, str]]): (source, destination) pairs.
+
+        Returns:
+            Dict[str, float]: The preprocessing time and memory, and the mean
+            time and settled vertices per query for both searches.
+        """
+        results = {"landmarks": len(self.landmarks), "preprocess_seconds": self.preprocess_seconds,
+                   "memory_bytes": self.memory_bytes()}
+        for label in ("dijkstra", "alt"):
+            settled = 0
+            started = time.perf_counter()
+            for source, target in queries:
+                if label == "dijkstra":
+                    cost, _ = cheapest_first_search(source, graph.neighbours, [target])
+                else:
+                    cost, _ = a_star_search(source, target, graph.neighbours, self.heuristic)
+                settled += len(cost)
+            elapsed = time.perf_counter() - started
+            results[label + "_seconds_per_query"] = elapsed / max(len(queries), 1)
+            results[label + "_settled_per_query"] = settled / max(len(queries), 1)
+        if results["alt_seconds_per_query"] > 0:
+            results["speedup"] = results["dijkstra_seconds_per_query"] / results["alt_seconds_per_query"]
+        return results
+
+
+class ContractionHierarchy:
+    """
+    A contraction hierarchy over a Graph, for fast route queries on networks
+    that rarely change.
+
+    Vertices are contracted one at a time, least important first (by edge
+    difference plus the number of already contracted neighbours). Contracting
+    v adds a shortcut u -> w for each pair of remaining neighbours whose
+    cheapest connection goes through v, unless a bounded witness search finds
+    a path that is at least as cheap without v. Queries then only follow edges
+    towards more important vertices, from both ends, and shortcuts are
+    unpacked back into the original edges. The hierarchy describes the graph
+    version it was built at.
+
+    Attributes:
+        names (List[str]): The name of every vertex, indexed by vertex id.
+        ids (Dict[str, int]): A mapping between vertex names and vertex ids.
+        rank (List[int]): The contraction order of every vertex.
+        up (List[Dict[int, float]]): Edges (original and shortcut) from every
+            vertex to more important ones.
+        down (List[Dict[int, float]]): Reversed edges into every vertex from
+            more important ones.
+        middle (Dict[Tuple[int, int], int]): The contracted vertex every shortcut bypasses.
+        version (int): The graph version the hierarchy was built at.
+        preprocess_seconds (float): How long building the hierarchy took.
+    """
+
+    def __init__(self, graph: Graph, witness_limit: int = 50):
+        """
+        Builds a ContractionHierarchy.
+
+        Args:
+            graph (Graph): The graph to contract.
+            witness_limit (int): The most vertices a witness search may settle
+                before the shortcut it is checking is added anyway.
+        """
+        started = time.perf_counter()
+        graph._sync_index()
+        self.version = graph.version
+        # Only the vertex the graph indexes under each name counts, as in find_path.
+        self.names = list(graph.index)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        out: List[Dict[int, float]] = [{} for _ in self.names]
+        into: List[Dict[int, float]] = [{} for _ in self.names]
+
+        for vertex in list(graph.index.values()):
+            u = self.ids[vertex.name]
+            for name, w in vertex.weights.items():
+                if name not in self.ids:
+                    self.ids[name] = len(self.names)
+                    self.names.append(name)
+                    out.append({})
+                    into.append({})
+                v = self.ids[name]
+                if u != v:
+                    out[u][v] = w
+                    into[v][u] = w
+
+        # out and into only hold edges between vertices not contracted yet;
+        # contracting v moves its remaining edges into up[v] and down[v].
+        n = len(self.names)
+        self.middle: Dict[Tuple[int, int], int] = {}
+        self.rank = [0] * n
+        self.up: List[Dict[int, float]] = [{} for _ in range(n)]
+        self.down: List[Dict[int, float]] = [{} for _ in range(n)]
+        contracted_neighbours = [0] * n
+
+        def priority(v: int, shortcuts: List[Tuple[int, int, float]]) -> int:
+            return len(shortcuts) - len(out[v]) - len(into[v]) + contracted_neighbours[v]
+
+        order_queue = [(priority(v, self._shortcuts(v, out, into, witness_limit)), v) for v in range(n)]
+        heapq.heapify(order_queue)
+        order = 0
+        while order_queue:
+            _, v = heapq.heappop(order_queue)
+            shortcuts = self._shortcuts(v, out, into, witness_limit)
+            current = priority(v, shortcuts)
+            if order_queue and current > order_queue[0][0]:
+                heapq.heappush(order_queue, (current, v))
+                continue
+
+            self.rank[v] = order
+            order += 1
+            self.up[v] = out[v]
+            self.down[v] = into[v]
+            for u in into[v]:
+                del out[u][v]
+                contracted_neighbours[u] += 1
+            for w in out[v]:
+                del into[w][v]
+                contracted_neighbours[w] += 1
+            out[v] = {}
+            into[v] = {}
+            for u, w, cost in shortcuts:
+                if cost < out[u].get(w, math.inf):
+                    out[u][w] = cost
+                    into[w][u] = cost
+                    self.middle[(u, w)] = v
+
+        self.preprocess_seconds = time.perf_counter() - started
+
+    @staticmethod
+    def _shortcuts(v: int, out: List[Dict[int, float]], into: List[Dict[int, float]],
+                   witness_limit: int) -> List[Tuple[int, int, float]]:
+        """
+        Works out which shortcuts contracting v would need.
+
+        Args:
+            v (int): The vertex to contract.
+            out (List[Dict[int, float]]): The outgoing edges between vertices not contracted yet.
+            into (List[Dict[int, float]]): The incoming edges between vertices not contracted yet.
+            witness_limit (int): The most vertices a witness search may settle.
+
+        Returns:
+            List[Tuple[int, int, float]]: (u, w, cost) for every shortcut u -> w.
+        """
+        targets = out[v]
+        shortcuts = []
+        if not targets:
+            return shortcuts
+        max_target = max(targets.values())
+
+        for u, to_v in into[v].items():
+            limit = to_v + max_target
+            distance = {u: 0.0}
+            frontier = [(0.0, u)]
+            remaining = set(targets)
+            remaining.discard(u)
+            settled = 0
+            while frontier and remaining and settled < witness_limit:
+                cost, x = heapq.heappop(frontier)
+                if cost > distance[x]:
+                    continue
+                if cost > limit:
+                    break
+                settled += 1
+                remaining.discard(x)
+                for y, w in out[x].items():
+                    if y == v:
+                        continue
+                    new_cost = cost + w
+                    if new_cost < distance.get(y, math.inf):
+                        distance[y] = new_cost
+                        heapq.heappush(frontier, (new_cost, y))
+
+            for w, from_v in targets.items():
+                if w != u and distance.get(w, math.inf) > to_v + from_v:
+                    shortcuts.append((u, w, to_v + from_v))
+        return shortcuts
+
+    def num_shortcuts(self) -> int:
+        """
+        Returns the number of shortcut edges in the hierarchy.
+        """
+        return len(self.middle)
+
+    def find_path(self, s_name: str, d_name: str) -> Optional[List[str]]:
+        """
+        Finds the cheapest path between two vertices with a bidirectional
+        search that only moves up the hierarchy, then unpacks the shortcuts.
+
+        Args:
+            s_name (str): The name of the source vertex.
+            d_name (str): The name of the destination vertex.
+
+        Returns:
+            Optional[List[str]]: An ordered list of vertex names representing the
+            path from s_name to d_name. If no path exists, returns None.
+        """
+        if s_name == d_name:
+            return [s_name]
+        source = self.ids.get(s_name)
+        target = self.ids.get(d_name)
+        if source is None or target is None:
+            return None
+
+        graphs = (self.up, self.down)
+        distance: Tuple[Dict[int, float], Dict[int, float]] = ({source: 0.0}, {target: 0.0})
+        previous: Tuple[Dict[int, int], Dict[int, int]] = ({source: -1}, {target: -1})
+        frontiers = ([(0.0, source)], [(0.0, target)])
+        best = math.inf
+        meeting = -1
+
+        while True:
+            live = [side for side in (0, 1) if frontiers[side] and frontiers[side][0][0] < best]
+            if not live:
+                break
+            side = min(live, key=lambda i: frontiers[i][0][0])
+            cost, x = heapq.heappop(frontiers[side])
+            if cost > distance[side][x]:
+                continue
+            other = distance[1 - side].get(x)
+            if other is not None and cost + other < best:
+                best = cost + other
+                meeting = x
+            for y, w in graphs[side][x].items():
+                new_cost = cost + w
+                if new_cost < distance[side].get(y, math.inf):
+                    distance[side][y] = new_cost
+                    previous[side][y] = x
+                    heapq.heappush(frontiers[side], (new_cost, y))
+
+        if meeting == -1:
+            return None
+
+        hops = []
+        x = meeting
+        while x != -1:
+            hops.append(x)
+            x = previous[0][x]
+        hops.reverse()
+        x = previous[1][meeting]
+        while x != -1:
+            hops.append(x)
+            x = previous[1][x]
+
+        path = [hops[0]]
+        for a, b in zip(hops, hops[1:]):
+            stack = [(a, b)]
+            while stack:
+                u, w = stack.pop()
+                v = self.middle.get((u, w))
+                if v is None:
+                    path.append(w)
+                else:
+                    stack.append((v, w))
+                    stack.append((u, v))
+        return [self.names[x] for x in path]
+
+    def cross_check(self, graph: Graph, queries: List[Tuple[str, str]]) -> Dict[str, object]:
+        """
+        Runs every query through both the hierarchy and the Cheapest-First
+        Search used by Device.find_path and compares the answers. A query
+        matches when both find a path or both find none, the hierarchy's path
+        is made of real edges of graph, and both paths cost the same. When
+        several paths tie for cheapest the two searches may return different
+        ones; identical_paths counts the queries where they agreed exactly.
+
+        Args:
+            graph (Graph): The graph the hierarchy was built on.
+            queries (List[Tuple[str, str]]): (source, destination) pairs.
+
+        Returns:
+            Dict[str, object]: The number of queries, the number with identical
+            paths, and the (source, destination) pairs that did not match.
+        """
+        def path_cost(path: List[str]) -> Optional[float]:
+            total = 0.0
+            for u, v in zip(path, path[1:]):
+                edge = graph.get_edge(u, v)
+                if edge is None:
+                    return None
+                total += edge[2]
+            return total
+
+        mismatches = []
+        identical = 0
+        for source, target in queries:
+            cost, previous = cheapest_first_search(source, graph.neighbours, [target])
+            expected = build_path(previous, target) if target in cost else None
+            found = self.find_path(source, target)
+            if found == expected:
+                identical += 1
+                continue
+            if found is None or expected is None or found[0] != source or found[-1] != target:
+                mismatches.append((source, target))
+                continue
+            found_cost = path_cost(found)
+            if found_cost is None or not math.isclose(found_cost, path_cost(expected), rel_tol=1e-12, abs_tol=1e-12):
+                mismatches.append((source, target))
+        return {"queries": len(queries), "identical_paths": identical, "mismatches": mismatches}
+
+
+class ReachabilityIndex:
+    """
+    Answers "is there a path from u to v" without searching.
+
+    The strongly connected components of the graph are found with an
+    iterative Tarjan search, which numbers them in reverse topological order
+    of the condensed DAG. Each component then gets a bitset label (a Python
+    int) of every component it can reach, built from the labels of its
+    successors, so a query is a single bit test. The labels take
+    O(components * reachable components / 8) bytes, which stays small when
+    links are mostly bidirectional. The index describes the graph version it
+    was built at.
+
+    Attributes:
+        ids (Dict[str, int]): A mapping between vertex names and vertex ids.
+        component (List[int]): The component number of every vertex.
+        reach (List[int]): The bitset of components reachable from every component.
+        version (int): The graph version the index was built at.
+    """
+
+    def __init__(self, graph: Graph):
+        """
+        Builds a ReachabilityIndex.
+
+        Args:
+            graph (Graph): The graph to index.
+        """
+        graph._sync_index()
+        self.version = graph.version
+        # Only the vertex the graph indexes under each name counts, as in find_path.
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(graph.index)}
+        adjacency: List[List[int]] = [[] for _ in self.ids]
+        for vertex in list(graph.index.values()):
+            edges = adjacency[self.ids[vertex.name]]
+            for name in vertex.weights:
+                if name not in self.ids:
+                    self.ids[name] = len(self.ids)
+                    adjacency.append([])
+                edges.append(self.ids[name])
+
+        n = len(adjacency)
+        order = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack: List[int] = []
+        self.component = [-1] * n
+        members: List[List[int]] = []
+        counter = 0
+
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, 0)]
+            while work:
+                v, i = work[-1]
+                if i < len(adjacency[v]):
+                    work[-1] = (v, i + 1)
+                    w = adjacency[v][i]
+                    if order[w] == -1:
+                        order[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, 0))
+                    elif on_stack[w] and order[w] < low[v]:
+                        low[v] = order[w]
+                    continue
+
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == order[v]:
+                    group = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        self.component[w] = len(members)
+                        group.append(w)
+                        if w == v:
+                            break
+                    members.append(group)
+
+        # Components finish sinks first, so every successor already has its label.
+        self.reach: List[int] = []
+        for c, group in enumerate(members):
+            successors = {self.component[w] for v in group for w in adjacency[v]}
+            successors.discard(c)
+            bits = 1 << c
+            for d in successors:
+                bits |= self.reach[d]
+            self.reach.append(bits)
+
+    def num_components(self) -> int:
+        """
+        Returns the number of strongly connected components.
+        """
+        return len(self.reach)
+
+    def is_reachable(self, u_name: str, v_name: str) -> bool:
+        """
+        Checks if there is a path from u_name to v_name.
+
+        Args:
+            u_name (str): The name of the vertex the path starts from.
+            v_name (str): The name of the vertex the path ends at.
+
+        Returns:
+            bool: True if v_name can be reached from u_name, False otherwise.
+        """
+        if u_name == v_name:
+            return True
+        u = self.ids.get(u_name)
+        v = self.ids.get(v_name)
+        if u is None or v is None:
+            return False
+        return (self.reach[self.component[u]] >> self.component[v]) & 1 == 1
+
+
+class Device(Vertex):
+    """
+    Represents a network device, extending the Vertex class with
+    device-specific functionality.
+
+    Attributes:
+        name (str): The label or identifier of the device.
+        children (Dict[str, Tuple[str, str, float]]):
+            A mapping between child device names and nearby devices.
+        network (Graph): A graph representing this device's discovered network.
+        probed (Set[str]): The devices in network whose edges have been probed.
+        settled (int): The number of devices settled by the last find_path search.
+        store (Optional[TopologyStore]): The shared store this device is
+            attached to, or None if its network is private.
+    """
+
+    __slots__ = ("network", "probed", "settled", "store")
+
+    def __init__(self, name: str, store: Optional["TopologyStore"] = None):
+        """
+        Initializes a Device.
+
+        If a store is given, the device does not get a network of its own:
+        network and probed are the store's, shared with every other device
+        attached to it (see TopologyStore).
+
+        Args:
+            name (str): The label or identifier of the device.
+            store (Optional[TopologyStore]): The shared store to attach to.
+        """
+        super().__init__(name)
+        self.store = store
+        if store is None:
+            self.network = Graph([self])
+            self.probed: Set[str] = set()
+        else:
+            self.network = store.attach(self)
+            self.probed = store.probed
+        self.settled = 0
+
+    def discover_network(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                         max_workers: Optional[int] = None, max_hops: Optional[int] = None,
+                         max_cost: Optional[float] = None,
+                         scheduler: Optional["ProbeScheduler"] = None) -> int:
+        """
+        Discovers the surrounding network starting from this device. Once this
+        function is called, self.network should contain a representation of the
+        device's discovered network.
+
+        Devices are crawled breadth-first and every device is probed exactly
+        once, however many routes lead to it: find_devices_fn is called once
+        per device reachable from this one, with the first (fewest hops) path
+        that reached it.
+
+        If max_workers is given, each breadth-first level is probed in parallel
+        on a thread pool of that size, which pays off when find_devices_fn
+        blocks on network I/O. Results are merged into self.network on the
+        calling thread in frontier order, so the graph is the same as the one
+        built serially; find_devices_fn itself must be safe to call from
+        several threads.
+
+        The crawl can be bounded. With max_hops, only devices at most that many
+        hops away are probed (0 probes only this device). With max_cost,
+        devices are instead probed cheapest first, in Cheapest-First Search
+        order along their cheapest path, and the crawl stops at the first
+        device whose cheapest path costs more than max_cost; max_hops then
+        limits the hops of that cheapest path. Devices found beyond the bounds
+        are recorded as children but not probed.
+
+        If a scheduler is given, it decides the probe order and issues the
+        probes under its rate limits and retry policy instead (see
+        ProbeScheduler); it cannot be combined with the other options.
+
+        If this device is attached to a TopologyStore, devices that have
+        already been probed through the store, by this device or any other,
+        are not probed again: their recorded edges are used instead.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its immediate children.
+            max_workers (Optional[int]): The number of probe threads, or None to
+                probe one device at a time on the calling thread.
+            max_hops (Optional[int]): The most hops away a probed device may be.
+            max_cost (Optional[float]): The most a probed device's cheapest path may cost.
+            scheduler (Optional[ProbeScheduler]): The scheduler to issue probes through.
+
+        Returns:
+            int: The number of devices probed. Without a scheduler or a store
+            this is also the number of calls made to find_devices_fn.
+        """
+        if self.store is not None:
+            find_devices_fn = self.store.deduplicate(find_devices_fn)
+        if scheduler is not None:
+            if max_workers is not None or max_hops is not None or max_cost is not None:
+                raise ValueError("a scheduler cannot be combined with max_workers, max_hops or max_cost")
+            return scheduler.discover(self, find_devices_fn)
+        if max_cost is not None:
+            if max_workers is not None:
+                raise ValueError("max_cost discovery is ordered by cost and cannot use max_workers")
+            return self._discover_by_cost(find_devices_fn, max_cost, max_hops)
+        if max_workers is not None:
+            return self._discover_concurrent(find_devices_fn, max_workers, max_hops)
+
+        probes = 0
+        for _ in self.iter_discover(find_devices_fn, max_hops):
+            probes += 1
+        return probes
+
+    def iter_discover(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                      max_hops: Optional[int] = None) -> Iterator[Tuple[str, List[Tuple[str, str, float]]]]:
+        """
+        Discovers the network like discover_network, one probe at a time,
+        yielding every probed device with its edges as soon as they have been
+        merged into self.network. At every yield, self.network holds a
+        consistent picture of everything probed so far, so consumers can use
+        it progressively; stopping the iteration stops the crawl.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its immediate children.
+            max_hops (Optional[int]): The most hops away a probed device may be.
+
+        Yields:
+            Tuple[str, List[Tuple[str, str, float]]]: The name of the probed
+            device and the edges the probe returned.
+        """
+        if self.store is not None:
+            find_devices_fn = self.store.deduplicate(find_devices_fn)
+        previous: Dict[str, Optional[str]] = {self.name: None}
+        hops = {self.name: 0}
+        to_visit = deque([self.name])
+
+        while to_visit:
+            current = to_visit.popleft()
+            edges = find_devices_fn(build_path(previous, current))
+
+            for v in self._merge_edges(current, edges):
+                if v not in previous:
+                    previous[v] = current
+                    hops[v] = hops[current] + 1
+                    if max_hops is None or hops[v] <= max_hops:
+                        to_visit.append(v)
+
+            yield current, edges
+
+    def _discover_concurrent(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                             max_workers: int, max_hops: Optional[int] = None) -> int:
+        """
+        Breadth-first discovery that probes each frontier level on a thread pool.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                The probe function, called from the pool threads.
+            max_workers (int): The number of probe threads.
+            max_hops (Optional[int]): The most hops away a probed device may be.
+
+        Returns:
+            int: The number of calls made to find_devices_fn.
+        """
+        previous: Dict[str, Optional[str]] = {self.name: None}
+        frontier = [self.name]
+        level = 0
+        probes = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while frontier and (max_hops is None or level <= max_hops):
+                paths = [build_path(previous, current) for current in frontier]
+                next_frontier = []
+
+                for current, edges in zip(frontier, pool.map(find_devices_fn, paths)):
+                    probes += 1
+                    for v in self._merge_edges(current, edges):
+                        if v not in previous:
+                            previous[v] = current
+                            next_frontier.append(v)
+
+                frontier = next_frontier
+                level += 1
+
+        return probes
+
+    def _discover_by_cost(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                          max_cost: float, max_hops: Optional[int] = None) -> int:
+        """
+        Discovery that probes devices in Cheapest-First Search order and stops
+        at the cost radius.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                The probe function.
+            max_cost (float): The most a probed device's cheapest path may cost.
+            max_hops (Optional[int]): The most hops a probed device's cheapest path may have.
+
+        Returns:
+            int: The number of calls made to find_devices_fn.
+        """
+        previous: Dict[str, Optional[str]] = {}
+        hops = {self.name: 0}
+        probes = 0
+
+        def neighbours(name: str) -> List[Tuple[str, float]]:
+            nonlocal probes
+            hops[name] = 0 if previous[name] is None else hops[previous[name]] + 1
+            if max_hops is not None and hops[name] > max_hops:
+                return []
+            edges = find_devices_fn(build_path(previous, name))
+            probes += 1
+            self._merge_edges(name, edges)
+            return self.network.neighbours(name)
+
+        cheapest_first_search(self.name, neighbours, previous=previous, max_cost=max_cost)
+        return probes
+
+    async def discover_network_async(self,
+                                     find_devices_fn: Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]],
+                                     max_concurrency: int = 100) -> int:
+        """
+        Discovers the surrounding network like discover_network, but with a
+        coroutine probe function so that many probes can be in flight at once
+        on a single event loop.
+
+        At most max_concurrency probes are awaited at the same time; devices
+        found beyond that wait in a queue until a probe slot frees up. Every
+        device is still probed exactly once. Because probes finish out of
+        order, the path a device is probed with is the one that reached it
+        first, which is not necessarily the one with the fewest hops. On a
+        device attached to a TopologyStore, probes are deduplicated as in
+        discover_network.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]):
+                A coroutine function that takes an ordered list of device names
+                (i.e., a path) and returns the edges from the last device in the
+                path to its immediate children.
+            max_concurrency (int): The maximum number of probes in flight.
+
+        Returns:
+            int: The number of devices probed. Without a store this is also the
+            number of calls made to find_devices_fn.
+
+        Raises:
+            ValueError: If max_concurrency is less than 1.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if self.store is not None:
+            find_devices_fn = self.store.deduplicate_async(find_devices_fn)
+        previous: Dict[str, Optional[str]] = {self.name: None}
+        to_visit: asyncio.Queue = asyncio.Queue()
+        to_visit.put_nowait(self.name)
+        probes = 0
+
+        async def worker() -> None:
+            nonlocal probes
+            while True:
+                current = await to_visit.get()
+                try:
+                    edges = await find_devices_fn(build_path(previous, current))
+                    probes += 1
+                    for v in self._merge_edges(current, edges):
+                        if v not in previous:
+                            previous[v] = current
+                            to_visit.put_nowait(v)
+                finally:
+                    to_visit.task_done()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+        finished = asyncio.ensure_future(to_visit.join())
+        await asyncio.wait([finished, *workers], return_when=asyncio.FIRST_COMPLETED)
+
+        # Workers only stop on their own when a probe raised; re-raise that.
+        finished.cancel()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(finished, *workers, return_exceptions=True)
+        for task in workers:
+            if not task.cancelled():
+                task.result()
+
+        return probes
+
+    def discover_sharded(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                         num_shards: int, max_hops: Optional[int] = None,
+                         start_method: Optional[str] = None) -> int:
+        """
+        Discovers the surrounding network like discover_network, spreading the
+        probes over num_shards worker processes. Each worker owns the devices
+        whose names hash to its shard (see shard_of) and is the only one to
+        call find_devices_fn for them, so CPU-bound work inside the probe runs
+        on as many cores as there are shards.
+
+        The crawl is breadth-first, one level at a time. This process keeps the
+        predecessor map, routes every frontier device with its path to the
+        queue of the shard that owns it, and collects the children the shards
+        report back, so each device is probed exactly once with the same
+        fewest-hops path discover_network would use. The shards keep the edges
+        they probed and hand them over when the crawl ends, at which point
+        they are merged into self.network. On a device attached to a
+        TopologyStore, devices already probed through the store are not routed
+        to the shards; their recorded edges are used instead.
+
+        Workers are started with the platform's default start method unless
+        start_method says otherwise; with any method but "fork",
+        find_devices_fn must be picklable. If a worker dies without replying,
+        for instance because it was killed, the crawl stops with a
+        RuntimeError instead of waiting for it forever.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its immediate children.
+            num_shards (int): The number of worker processes.
+            max_hops (Optional[int]): The most hops away a probed device may be.
+            start_method (Optional[str]): The multiprocessing start method
+                ("fork", "spawn" or "forkserver"), or None for the default.
+
+        Returns:
+            int: The number of calls made to find_devices_fn.
+
+        Raises:
+            ValueError: If num_shards is less than 1.
+            RuntimeError: If a worker process exited without replying.
+            Exception: Whatever find_devices_fn raised in a worker.
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+
+        context = multiprocessing.get_context(start_method)
+        inboxes = [context.Queue() for _ in range(num_shards)]
+        outbox = context.Queue()
+        workers = [context.Process(target=_shard_worker, args=(find_devices_fn, shard, inboxes[shard], outbox),
+                                   daemon=True) for shard in range(num_shards)]
+        for worker in workers:
+            worker.start()
+
+        def collect(shards: Iterable[int]) -> List[Tuple[int, Any]]:
+            waiting = set(shards)
+            replies = []
+            dead: Set[int] = set()
+            while waiting:
+                try:
+                    shard, reply = outbox.get(timeout=0.1)
+                except queue.Empty:
+                    # A worker that had already exited on the previous poll
+                    # has had time to flush any reply it sent; it is gone.
+                    lost = dead & waiting
+                    if lost:
+                        shard = min(lost)
+                        raise RuntimeError("shard %d worker exited with code %s without replying"
+                                           % (shard, workers[shard].exitcode)) from None
+                    dead = {shard for shard in waiting if not workers[shard].is_alive()}
+                    continue
+                if isinstance(reply, BaseException):
+                    raise reply
+                waiting.discard(shard)
+                replies.append((shard, reply))
+            return replies
+
+        previous: Dict[str, Optional[str]] = {self.name: None}
+        frontier = [self.name]
+        level = 0
+        probes = 0
+        finished = False
+
+        try:
+            while frontier and (max_hops is None or level <= max_hops):
+                batches: List[List[Tuple[int, List[str]]]] = [[] for _ in range(num_shards)]
+                children: List[List[str]] = [[] for _ in frontier]
+                for i, current in enumerate(frontier):
+                    edges = None if self.store is None else self.store.recorded(current)
+                    if edges is not None:
+                        children[i] = [v for _, v, _ in edges]
+                    else:
+                        batches[shard_of(current, num_shards)].append((i, build_path(previous, current)))
+                        probes += 1
+                busy = []
+                for shard, batch in enumerate(batches):
+                    if batch:
+                        inboxes[shard].put(batch)
+                        busy.append(shard)
+
+                for _, reply in collect(busy):
+                    for i, names in reply:
+                        children[i] = names
+
+                next_frontier = []
+                for current, names in zip(frontier, children):
+                    for v in names:
+                        if v not in previous:
+                            previous[v] = current
+                            next_frontier.append(v)
+                frontier = next_frontier
+                level += 1
+
+            for inbox in inboxes:
+                inbox.put(None)
+            for _, probed in sorted(collect(range(num_shards)), key=lambda reply: reply[0]):
+                for current, edges in probed.items():
+                    self._merge_edges(current, edges)
+            if self.store is not None:
+                with self.store.lock:
+                    self.store.probes += probes
+            finished = True
+        finally:
+            for worker in workers:
+                worker.join(timeout=1.0 if finished else 0)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+        return probes
+
+    def rediscover(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                   dirty: Iterable[str]) -> "NetworkDiff":
+        """
+        Incrementally refreshes an already discovered self.network.
+
+        Only the dirty devices are re-probed, plus any device that shows up for
+        the first time in their answers (and so on, transitively). Their edges
+        are added, removed and re-weighted in place, and devices that can no
+        longer be reached from this one are dropped. A change notification for
+        the link u -> v is handled by passing u as dirty.
+
+        If find_devices_fn has an invalidate(name) method, as a ProbeCache
+        does, it is called for every dirty device first, so that they are
+        really re-probed rather than answered from the cache.
+
+        On a device attached to a TopologyStore, the dirty devices are always
+        re-probed and every change is made under the store's lock. Unreachable
+        devices are kept, since other devices may still reach them.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its immediate children.
+            dirty (Iterable[str]): The names of the devices whose links may have changed.
+
+        Returns:
+            NetworkDiff: What changed in self.network.
+        """
+        diff = NetworkDiff()
+        with self._guard():
+            previous = self._hop_predecessors()
+        to_visit = deque(name for name in dict.fromkeys(dirty) if self.network.get_vertex(name) is not None)
+        queued = set(to_visit)
+        invalidate = getattr(find_devices_fn, "invalidate", None)
+        if invalidate is not None:
+            for name in to_visit:
+                invalidate(name)
+
+        while to_visit:
+            current = to_visit.popleft()
+            path = build_path(previous, current) if current in previous else [current]
+            edges = find_devices_fn(path)
+            diff.probes += 1
+
+            with self._guard():
+                old_children = dict(self.network.get_vertex(current).weights)
+                new_children = {v: w for _, v, w in edges}
+
+                for v in old_children:
+                    if v not in new_children:
+                        diff.removed_edges.append(self.network.remove_edge(current, v))
+
+                for v, w in new_children.items():
+                    is_new = self.network.get_vertex(v) is None
+                    edge = self.network.add_edge(current, v, w)
+                    if v not in old_children:
+                        diff.added_edges.append(edge)
+                    elif old_children[v] != w:
+                        diff.changed_edges.append(((current, v, old_children[v]), edge))
+
+                    if is_new:
+                        diff.added_devices.append(v)
+                    if v not in previous:
+                        previous[v] = current
+                    if is_new and v not in queued:
+                        queued.add(v)
+                        to_visit.append(v)
+                self.probed.add(current)
+
+        if diff.removed_edges and self.store is None:
+            reachable = self._hop_predecessors()
+            diff.removed_devices = [vertex.name for vertex in self.network.vertices
+                                    if vertex.name not in reachable]
+            self.network.remove_vertices(diff.removed_devices)
+            self.probed.difference_update(diff.removed_devices)
+
+        return diff
+
+    def _hop_predecessors(self) -> Dict[str, Optional[str]]:
+        """
+        Runs a breadth-first search over self.network from this device.
+
+        Returns:
+            Dict[str, Optional[str]]: The predecessor of every reachable device on
+            a fewest-hops path (None for this device).
+        """
+        previous: Dict[str, Optional[str]] = {self.name: None}
+        to_visit = deque([self.name])
+        while to_visit:
+            current = to_visit.popleft()
+            for v, _ in self.network.neighbours(current):
+                if v not in previous:
+                    previous[v] = current
+                    to_visit.append(v)
+        return previous
+
+    def _merge_edges(self, current: str, edges: List[Tuple[str, str, float]]) -> List[str]:
+        """
+        Records the edges found by probing a device in self.network.
+
+        Args:
+            current (str): The name of the probed device.
+            edges (List[Tuple[str, str, float]]): The edges returned by the probe.
+
+        Returns:
+            List[str]: The names of the children of the probed device, in the
+            order the probe returned them.
+        """
+        if self.store is not None:
+            return self.store.record(current, edges)
+        self.network.ensure_vertex(current)
+        self.probed.add(current)
+        children = []
+        for _, v, w in edges:
+            self.network.add_edge(current, v, w)
+            children.append(v)
+        return children
+
+    def _guard(self) -> Any:
+        """
+        Returns the lock of this device's store, or a no-op context manager
+        if the device's network is private.
+        """
+        return self.store.lock if self.store is not None else contextlib.nullcontext()
+
+    def find_path(self, d_name: str,
+                  find_devices_fn: Optional[Callable[[List[str]], List[Tuple[str, str, float]]]] = None,
+                  strategy: str = "dijkstra",
+                  heuristic: Optional[Callable[[str, str], float]] = None) -> Optional[List[str]]:
+        """
+        Finds the cheapest path from this device to the specified target device 
+        using the Cheapest-First Search (CFS) algorithm.
+
+        The strategy selects the search:
+            "dijkstra": plain Cheapest-First Search (the default).
+            "bidirectional": Dijkstra from both ends at once, meeting in the
+                middle; needs the whole network to be discovered.
+            "astar": A* guided by heuristic, which must never overestimate the
+                remaining cost (see coordinate_heuristic and hop_heuristic).
+            "alt": A* guided by the landmark bounds of self.network.landmarks,
+                which must have been built by preprocess_landmarks since the
+                network last changed.
+        All strategies return a cheapest path, but when several paths tie they
+        may pick different ones. The number of devices the search settled is
+        left in self.settled, to compare strategies on the same network.
+
+        If self.network has a path_cache, "dijkstra" queries are answered from
+        the cached shortest path tree of this device. If a reachability index
+        has been built for the current network (see Graph.reachability),
+        unreachable targets return None without searching.
+
+        If find_devices_fn is given, the network does not need to have been
+        discovered beforehand: a device is probed (once, and only if it has not
+        been probed already) when the search settles it, and the search stops
+        as soon as the target is settled. The probed edges are kept in
+        self.network for later queries. On a device attached to a
+        TopologyStore, probes are deduplicated as in discover_network.
+
+        Args:
+            d_name (str): The name of the destination device.
+            find_devices_fn (Optional[Callable[[List[str]], List[Tuple[str, str, float]]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its
+                immediate children, used to expand the network lazily.
+            strategy (str): "dijkstra", "bidirectional", "astar" or "alt".
+            heuristic (Optional[Callable[[str, str], float]]): For "astar", a
+                lower bound on the cost of the cheapest path from a device to
+                the destination.
+
+        Returns:
+            Optional[List[str]]: An ordered list of device names representing the path 
+            from this device to the target. If no path exists, returns None.
+        """
+        if strategy not in ("dijkstra", "bidirectional", "astar", "alt"):
+            raise ValueError("unknown search strategy: %r" % strategy)
+        if strategy == "alt":
+            landmarks = self.network.landmarks
+            if landmarks is None or landmarks.version != self.network.version:
+                raise ValueError("the alt strategy needs up to date landmarks; call preprocess_landmarks")
+            strategy, heuristic = "astar", landmarks.heuristic
+        if strategy == "astar" and heuristic is None:
+            raise ValueError("the astar strategy needs a heuristic")
+
+        if find_devices_fn is None:
+            reachability = self.network.current_reachability()
+            if reachability is not None and not reachability.is_reachable(self.name, d_name):
+                self.settled = 0
+                return None
+
+        if strategy == "bidirectional":
+            if find_devices_fn is not None:
+                raise ValueError("bidirectional search needs a fully discovered network")
+            path, self.settled = bidirectional_search(self.name, d_name, self.network.neighbours,
+                                                      self.network.reverse_neighbours)
+            return path
+
+        if strategy == "dijkstra" and find_devices_fn is None and self.network.path_cache is not None:
+            self.settled = 0
+            return self.network.shortest_path_tree(self.name).path_to(d_name)
+
+        previous: Dict[str, Optional[str]] = {}
+        neighbours = self.network.neighbours
+        if find_devices_fn is not None:
+            if self.store is not None:
+                find_devices_fn = self.store.deduplicate(find_devices_fn)
+
+            def neighbours(name: str) -> List[Tuple[str, float]]:
+                if name not in self.probed:
+                    self._merge_edges(name, find_devices_fn(build_path(previous, name)))
+                return self.network.neighbours(name)
+
+        if strategy == "astar":
+            cost, previous = a_star_search(self.name, d_name, neighbours, heuristic, previous)
+        else:
+            cost, previous = cheapest_first_search(self.name, neighbours, [d_name], previous)
+        self.settled = len(cost)
+        if d_name not in cost:
+            return None
+        return build_path(previous, d_name)
+
+    def is_reachable(self, d_name: str) -> bool:
+        """
+        Checks if there is a path from this device to the specified device,
+        using the reachability index of self.network (built on first use and
+        rebuilt after the network changes).
+
+        Args:
+            d_name (str): The name of the destination device.
+
+        Returns:
+            bool: True if d_name can be reached from this device, False otherwise.
+        """
+        return self.network.reachability().is_reachable(self.name, d_name)
+
+    def find_paths(self, targets: Iterable[str]) -> Dict[str, Optional[Tuple[List[str], float]]]:
+        """
+        Finds the cheapest paths from this device to several target devices
+        with a single Cheapest-First Search, which stops as soon as every
+        target has been settled. Each path is the one find_path would return.
+
+        Args:
+            targets (Iterable[str]): The names of the destination devices.
+
+        Returns:
+            Dict[str, Optional[Tuple[List[str], float]]]: For every target, the
+            ordered list of device names from this device to it and the path
+            cost, or None if no path exists.
+        """
+        targets = list(targets)
+        if self.network.path_cache is not None:
+            tree = self.network.shortest_path_tree(self.name)
+        else:
+            tree = ShortestPathTree(self.name, *cheapest_first_search(self.name, self.network.neighbours, targets))
+        return {name: (tree.path_to(name), tree.cost[name]) if name in tree else None
+                for name in targets}
+
+    def shortest_path_tree(self) -> ShortestPathTree:
+        """
+        Finds the cheapest paths from this device to every reachable device with
+        a single Cheapest-First Search.
+
+        Returns:
+            ShortestPathTree: The cheapest path tree rooted at this device.
+        """
+        return self.network.shortest_path_tree(self.name)
+
+
+class TopologyStore:
+    """
+    A network graph shared by several devices. Devices created with
+    Device(name, store=store) all use store.graph as their network, so the
+    topology is held once however many devices look at it, and discovery from
+    any of them fills in the common graph.
+
+    Probes are deduplicated across the devices: a device that has been probed
+    through the store is never probed again by discovery, and if two threads
+    or coroutines reach the same device at the same time, one probes it while
+    the others wait for the result. Writes to the graph are made under lock, so
+    devices may discover concurrently from different threads; queries should
+    wait until the discoveries writing to the store have finished, or hold
+    lock themselves.
+
+    Attributes:
+        graph (Graph): The shared network.
+        probed (Set[str]): The devices in graph whose edges have been probed.
+        probes (int): The number of calls made to probe functions through the store.
+        lock (threading.RLock): Guards graph, probed and probes.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty TopologyStore.
+        """
+        self.graph = Graph([])
+        self.probed: Set[str] = set()
+        self.probes = 0
+        self.lock = threading.RLock()
+        self._pending: Dict[str, threading.Event] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    def attach(self, device: "Device") -> Graph:
+        """
+        Adds a device to the shared graph, unless a device with its name is
+        already there.
+
+        Args:
+            device (Device): The device to attach.
+
+        Returns:
+            Graph: The shared graph.
+        """
+        with self.lock:
+            if self.graph.get_vertex(device.name) is None:
+                self.graph.add_vertex(device)
+        return self.graph
+
+    def record(self, current: str, edges: List[Tuple[str, str, float]]) -> List[str]:
+        """
+        Records the edges found by probing a device in the shared graph.
+
+        Args:
+            current (str): The name of the probed device.
+            edges (List[Tuple[str, str, float]]): The edges returned by the probe.
+
+        Returns:
+            List[str]: The names of the children of the probed device, in the
+            order the probe returned them.
+        """
+        with self.lock:
+            self.graph.ensure_vertex(current)
+            self.probed.add(current)
+            children = []
+            for _, v, w in edges:
+                self.graph.add_edge(current, v, w)
+                children.append(v)
+            return children
+
+    def recorded(self, name: str) -> Optional[List[Tuple[str, str, float]]]:
+        """
+        Returns the edges recorded for a device probed through the store.
+
+        Args:
+            name (str): The name of the device.
+
+        Returns:
+            Optional[List[Tuple[str, str, float]]]: The edges from the device
+            to its children, or None if it has not been probed.
+        """
+        with self.lock:
+            if name not in self.probed:
+                return None
+            vertex = self.graph.get_vertex(name)
+            return [(vertex.name, v, w) for v, w in vertex.weights.items()]
+
+    def probe(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+              path: List[str]) -> List[Tuple[str, str, float]]:
+        """
+        Probes the last device in path, unless it has been probed through the
+        store already, and records the result.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]): The probe function.
+            path (List[str]): The sequence of device names leading to the device.
+
+        Returns:
+            List[Tuple[str, str, float]]: The edges from the device to its children.
+        """
+        name = path[-1]
+        while True:
+            with self.lock:
+                edges = self.recorded(name)
+                if edges is not None:
+                    return edges
+                pending = self._pending.get(name)
+                if pending is None:
+                    pending = self._pending[name] = threading.Event()
+                    break
+            # Someone else is probing it; use their result, or retry if it failed.
+            pending.wait()
+
+        try:
+            edges = find_devices_fn(path)
+            with self.lock:
+                self.probes += 1
+                self.record(name, edges)
+        finally:
+            self._release(name, pending)
+        return edges
+
+    async def probe_async(self, find_devices_fn: Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]],
+                          path: List[str]) -> List[Tuple[str, str, float]]:
+        """
+        Like probe, for a coroutine probe function. Waiting for a probe in
+        progress elsewhere does not block the event loop.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]):
+                The coroutine probe function.
+            path (List[str]): The sequence of device names leading to the device.
+
+        Returns:
+            List[Tuple[str, str, float]]: The edges from the device to its children.
+        """
+        name = path[-1]
+        while True:
+            with self.lock:
+                edges = self.recorded(name)
+                if edges is not None:
+                    return edges
+                pending = self._pending.get(name)
+                if pending is None:
+                    pending = self._pending[name] = threading.Event()
+                    break
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.setdefault(name, []).append(waiter)
+            await waiter
+
+        try:
+            edges = await find_devices_fn(path)
+            with self.lock:
+                self.probes += 1
+                self.record(name, edges)
+        finally:
+            self._release(name, pending)
+        return edges
+
+    def _release(self, name: str, pending: threading.Event) -> None:
+        """
+        Ends the probe in progress of a device and wakes everyone waiting for it.
+        """
+        with self.lock:
+            del self._pending[name]
+            waiters = self._waiters.pop(name, [])
+        pending.set()
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(self._wake, waiter)
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future) -> None:
+        """
+        Resolves a coroutine's wait for a probe, unless it was cancelled.
+        """
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def deduplicate(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]]
+                    ) -> Callable[[List[str]], List[Tuple[str, str, float]]]:
+        """
+        Wraps a probe function so that every call goes through probe.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]): The probe function.
+
+        Returns:
+            Callable[[List[str]], List[Tuple[str, str, float]]]: The wrapped
+            function, or find_devices_fn itself if it is already wrapped by this store.
+        """
+        if getattr(find_devices_fn, "store", None) is self:
+            return find_devices_fn
+
+        def deduplicated(path: List[str]) -> List[Tuple[str, str, float]]:
+            return self.probe(find_devices_fn, path)
+
+        deduplicated.store = self
+        return deduplicated
+
+    def deduplicate_async(self, find_devices_fn: Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]
+                          ) -> Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]:
+        """
+        Wraps a coroutine probe function so that every call goes through probe_async.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]):
+                The coroutine probe function.
+
+        Returns:
+            Callable[[List[str]], Awaitable[List[Tuple[str, str, float]]]]: The
+            wrapped function, or find_devices_fn itself if it is already wrapped by this store.
+        """
+        if getattr(find_devices_fn, "store", None) is self:
+            return find_devices_fn
+
+        async def deduplicated(path: List[str]) -> List[Tuple[str, str, float]]:
+            return await self.probe_async(find_devices_fn, path)
+
+        deduplicated.store = self
+        return deduplicated
+
+
+class NetworkDiff:
+    """
+    The changes an incremental rediscovery made to a network.
+
+    Attributes:
+        added_edges (List[Tuple[str, str, float]]): Edges that did not exist before.
+        removed_edges (List[Tuple[str, str, float]]): Edges that no longer exist.
+        changed_edges (List[Tuple[Tuple[str, str, float], Tuple[str, str, float]]]):
+            (old edge, new edge) pairs for edges whose weight changed.
+        added_devices (List[str]): Devices that were not in the network before.
+        removed_devices (List[str]): Devices that are no longer reachable.
+        probes (int): The number of calls made to find_devices_fn.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty NetworkDiff.
+        """
+        self.added_edges: List[Tuple[str, str, float]] = []
+        self.removed_edges: List[Tuple[str, str, float]] = []
+        self.changed_edges: List[Tuple[Tuple[str, str, float], Tuple[str, str, float]]] = []
+        self.added_devices: List[str] = []
+        self.removed_devices: List[str] = []
+        self.probes = 0
+
+    def __bool__(self) -> bool:
+        """
+        Returns True if anything in the network changed.
+        """
+        return bool(self.added_edges or self.removed_edges or self.changed_edges
+                    or self.added_devices or self.removed_devices)
+
+
+class ProbeCache:
+    """
+    A caching layer around a find_devices_fn, keyed by device name.
+
+    A ProbeCache is itself a valid find_devices_fn, so it can be passed to any
+    of the Device discovery methods in place of the probe it wraps. Entries
+    expire ttl seconds after they were probed, and once more than max_size
+    devices are cached the least recently used one is evicted. If path is
+    given, entries are loaded from that JSON file on construction and written
+    back by save(), so a restarted collector starts warm.
+
+    Attributes:
+        find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+            The probe function whose results are cached.
+        ttl (Optional[float]): Seconds an entry stays valid, or None for no expiry.
+        max_size (Optional[int]): The maximum number of cached devices, or None
+            for no bound.
+        path (Optional[str]): The file backing the cache, if any.
+        hits (int): The number of calls answered from the cache.
+        misses (int): The number of calls that had to probe.
+    """
+
+    def __init__(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+                 ttl: Optional[float] = None, max_size: Optional[int] = None,
+                 path: Optional[str] = None):
+        """
+        Initializes a ProbeCache.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                The probe function whose results are cached.
+            ttl (Optional[float]): Seconds an entry stays valid, or None for no expiry.
+            max_size (Optional[int]): The maximum number of cached devices, or
+                None for no bound.
+            path (Optional[str]): A JSON file to load entries from and save them to.
+        """
+        self.find_devices_fn = find_devices_fn
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[Tuple[str, str, float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for name, (probed_at, edges) in json.load(f).items():
+                    self._entries[name] = (probed_at, [(u, v, w) for u, v, w in edges])
+            self._evict()
+
+    def __call__(self, path: List[str]) -> List[Tuple[str, str, float]]:
+        """
+        Returns the edges of the last device in path, probing it only if it
+        has no fresh cache entry.
+
+        Args:
+            path (List[str]): An ordered list of device names.
+
+        Returns:
+            List[Tuple[str, str, float]]: The edges from the last device in the path.
+        """
+        name = path[-1]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and not self._expired(entry[0]):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        edges = self.find_devices_fn(path)
+        with self._lock:
+            self._entries[name] = (time.time(), list(edges))
+            self._entries.move_to_end(name)
+            self._evict()
+        return edges
+
+    def __len__(self) -> int:
+        """
+        Returns the number of cached devices, including expired entries that
+        have not been replaced yet.
+        """
+        return len(self._entries)
+
+    def _expired(self, probed_at: float) -> bool:
+        """
+        Checks whether an entry probed at the given wall-clock time has outlived the TTL.
+        """
+        return self.ttl is not None and time.time() - probed_at > self.ttl
+
+    def _evict(self) -> None:
+        """
+        Drops least recently used entries until the cache fits in max_size.
+        """
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """
+        Drops the cached entry of one device, or every entry if name is None.
+
+        Args:
+            name (Optional[str]): The name of the device to forget.
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def save(self) -> None:
+        """
+        Writes the unexpired entries to self.path, replacing the file atomically.
+        """
+        if self.path is None:
+            raise ValueError("ProbeCache has no backing file")
+        with self._lock:
+            data = {name: [probed_at, edges] for name, (probed_at, edges) in self._entries.items()
+                    if not self._expired(probed_at)}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): The most tokens the bucket holds, i.e. the largest burst.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Initializes a full TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): The most tokens the bucket holds.
+            clock (Callable[[], float]): The time source, in seconds.
+            sleep (Callable[[float], None]): The function used to wait.
+
+        Raises:
+            ValueError: If rate is not positive or capacity is less than 1,
+                either of which would leave acquire waiting forever.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes one token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+
+
+class ProbeScheduler:
+    """
+    Issues the probes of a discovery crawl in priority order, under a global
+    and a per-subnet rate limit, retrying failed probes with exponential
+    backoff.
+
+    The crawl keeps up to max_workers probes in flight on a thread pool and
+    always starts the waiting device with the lowest priority key next. The
+    default key is the cost of the cheapest path found to the device so far,
+    so with one worker devices are probed in Cheapest-First Search order. A
+    device is probed once; if all its retries fail, the last error is kept
+    in failed and the crawl carries on without it.
+
+    Attributes:
+        max_workers (int): The most probes in flight at once.
+        rate_limit (Optional[TokenBucket]): The limit on all probes, if any.
+        subnet_rate (Optional[float]): Probes per second allowed per subnet, if limited.
+        subnet_burst (float): The largest burst allowed per subnet.
+        subnet_fn (Callable[[str], Any]): Maps a device name to its subnet.
+        priority (Callable[[str, float, int], Any]): Maps (device name, path
+            cost, path hops) to a sort key; lower keys are probed first.
+        max_retries (int): How many times a failed probe is retried.
+        backoff (float): The wait before the first retry, doubled for each further one.
+        max_backoff (float): The longest wait between retries.
+        attempts (int): The number of calls made to find_devices_fn.
+        retries (int): The number of those calls that were retries.
+        failed (Dict[str, Exception]): The devices whose probes all failed.
+    """
+
+    def __init__(self, max_workers: int = 1, rate: Optional[float] = None, burst: float = 1.0,
+                 subnet_rate: Optional[float] = None, subnet_burst: float = 1.0,
+                 subnet_fn: Optional[Callable[[str], Any]] = None,
+                 priority: Optional[Callable[[str, float, int], Any]] = None,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Initializes a ProbeScheduler.
+
+        Args:
+            max_workers (int): The most probes in flight at once.
+            rate (Optional[float]): Probes per second across all devices, or None for no limit.
+            burst (float): The largest burst allowed across all devices.
+            subnet_rate (Optional[float]): Probes per second per subnet, or None for no limit.
+            subnet_burst (float): The largest burst allowed per subnet.
+            subnet_fn (Optional[Callable[[str], Any]]): Maps a device name to its
+                subnet, e.g. lambda name: name.rsplit(".", 1)[0] for /24s of
+                IPv4 addresses. Defaults to one subnet per device.
+            priority (Optional[Callable[[str, float, int], Any]]): Maps (device
+                name, path cost, path hops) to a sort key. Defaults to the path cost.
+            max_retries (int): How many times a failed probe is retried.
+            backoff (float): The wait in seconds before the first retry.
+            max_backoff (float): The longest wait in seconds between retries.
+            clock (Callable[[], float]): The time source used by the rate limits.
+            sleep (Callable[[float], None]): The function used to wait.
+
+        Raises:
+            ValueError: If a rate is not positive or its burst is less than 1.
+        """
+        if subnet_rate is not None and (subnet_rate <= 0 or subnet_burst < 1):
+            # The per-subnet buckets are only built on first use; fail here instead.
+            raise ValueError("subnet_rate must be positive and subnet_burst at least 1")
+        self.max_workers = max_workers
+        self.rate_limit = TokenBucket(rate, burst, clock, sleep) if rate is not None else None
+        self.subnet_rate = subnet_rate
+        self.subnet_burst = subnet_burst
+        self.subnet_fn = subnet_fn if subnet_fn is not None else (lambda name: name)
+        self.priority = priority if priority is not None else (lambda name, cost, hops: cost)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.attempts = 0
+        self.retries = 0
+        self.failed: Dict[str, Exception] = {}
+        self._clock = clock
+        self._sleep = sleep
+        self._subnet_limits: Dict[Any, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def probe(self, find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]],
+              path: List[str]) -> List[Tuple[str, str, float]]:
+        """
+        Calls find_devices_fn under the rate limits, retrying with backoff if
+        it raises.
+
+        Args:
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                The probe function.
+            path (List[str]): The path to pass to it.
+
+        Returns:
+            List[Tuple[str, str, float]]: The edges it returned.
+
+        Raises:
+            Exception: The error of the last attempt, if every attempt failed.
+        """
+        subnet_limit = None
+        if self.subnet_rate is not None:
+            subnet = self.subnet_fn(path[-1])
+            with self._lock:
+                subnet_limit = self._subnet_limits.get(subnet)
+                if subnet_limit is None:
+                    subnet_limit = TokenBucket(self.subnet_rate, self.subnet_burst, self._clock, self._sleep)
+                    self._subnet_limits[subnet] = subnet_limit
+
+        attempt = 0
+        while True:
+            if subnet_limit is not None:
+                subnet_limit.acquire()
+            if self.rate_limit is not None:
+                self.rate_limit.acquire()
+            with self._lock:
+                self.attempts += 1
+            try:
+                return find_devices_fn(path)
+            except Exception:
+                if attempt >= self.max_retries:
+                    raise
+            self._sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+
+    def discover(self, device: "Device",
+                 find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]]) -> int:
+        """
+        Discovers the network around a device, merging the results into
+        device.network on the calling thread.
+
+        Args:
+            device (Device): The device to start from.
+            find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]):
+                A function that takes an ordered list of device names (i.e., a path)
+                and returns the edges from the last device in the path to its immediate children.
+
+        Returns:
+            int: The number of devices probed successfully.
+        """
+        previous: Dict[str, Optional[str]] = {device.name: None}
+        cost = {device.name: 0.0}
+        hops = {device.name: 0}
+        keys = {device.name: self.priority(device.name, 0.0, 0)}
+        frontier = [(keys[device.name], 0, device.name)]
+        started: Set[str] = set()
+        in_flight: Dict[Any, str] = {}
+        counter = 1
+        probes = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while frontier or in_flight:
+                while frontier and len(in_flight) < self.max_workers:
+                    key, _, name = heapq.heappop(frontier)
+                    if name in started or key != keys[name]:
+                        continue
+                    started.add(name)
+                    in_flight[pool.submit(self.probe, find_devices_fn, build_path(previous, name))] = name
+                if not in_flight:
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = in_flight.pop(future)
+                    try:
+                        edges = future.result()
+                    except Exception as error:
+                        self.failed[name] = error
+                        continue
+                    probes += 1
+                    device._merge_edges(name, edges)
+
+                    for _, v, w in edges:
+                        if v in started:
+                            continue
+                        key = self.priority(v, cost[name] + w, hops[name] + 1)
+                        if v not in keys or key < keys[v]:
+                            keys[v] = key
+                            previous[v] = name
+                            cost[v] = cost[name] + w
+                            hops[v] = hops[name] + 1
+                            heapq.heappush(frontier, (key, counter, v))
+                            counter += 1
+
+        return probes
+
+
+# ----------------------------------------------------------------------
+# Sharded discovery
+# ----------------------------------------------------------------------
+def shard_of(name: str, num_shards: int) -> int:
+    """
+    Returns the shard that owns a device in sharded discovery. The hash is
+    stable across processes and runs, unlike the built-in hash of a str.
+
+    Args:
+        name (str): The name of the device.
+        num_shards (int): The number of shards.
+
+    Returns:
+        int: The shard index, from 0 to num_shards - 1.
+    """
+    return zlib.crc32(name.encode("utf-8")) % num_shards
+
+
+def _shard_worker(find_devices_fn: Callable[[List[str]], List[Tuple[str, str, float]]], shard: int,
+                  inbox: Any, outbox: Any) -> None:
+    """
+    The loop run by each worker process of Device.discover_sharded.
+
+    Every message on inbox is a batch of (frontier index, path) pairs for
+    devices this shard owns. The worker probes each one and replies on outbox
+    with the children it found, keeping the edges to itself. A None message
+    ends the crawl: the worker replies with all the edges it probed, keyed by
+    device, and exits. If a probe raises, the exception is sent instead.
+
+    Args:
+        find_devices_fn (Callable[[List[str]], List[Tuple[str, str, float]]]): The probe function.
+        shard (int): The index of this shard, sent with every reply.
+        inbox (multiprocessing.Queue): The batches for this shard.
+        outbox (multiprocessing.Queue): The replies, shared by all shards.
+    """
+    probed: Dict[str, List[Tuple[str, str, float]]] = {}
+    try:
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                break
+            reply = []
+            for i, path in batch:
+                edges = list(find_devices_fn(path))
+                probed[path[-1]] = edges
+                reply.append((i, [v for _, v, _ in edges]))
+            outbox.put((shard, reply))
+        outbox.put((shard, probed))
+    except Exception as error:
+        outbox.put((shard, error))
+
+
+# ----------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------
+def _random_edges(num_vertices: int, num_edges: int, seed: int = 0) -> List[Tuple[str, str, float]]:
+    """
+    Generates a random edge list for the benchmarks.
+
+    Args:
+        num_vertices (int): The number of distinct device names.
+        num_edges (int): The number of edges to generate.
+        seed (int): The random seed.
+
+    Returns:
+        List[Tuple[str, str, float]]: The (source, child, weight) edges.
+    """
+    rng = random.Random(seed)
+    names = ["device-%d" % i for i in range(num_vertices)]
+    return [(names[rng.randrange(num_vertices)], names[rng.randrange(num_vertices)],
+             float(rng.randint(1, 100))) for _ in range(num_edges)]
+
+
+def benchmark_memory(num_vertices: int = 100_000, num_edges: int = 1_000_000) -> Dict[str, int]:
+    """
+    Compares the memory taken by the original vertex layout (an instance
+    __dict__ per vertex and a (source, child, weight) tuple per edge) with the
+    current slotted layout, for the same random graph. The current layout's
+    figure includes the reverse adjacency index, which accounts for about
+    40% of it.
+
+    Args:
+        num_vertices (int): The number of vertices in the graph.
+        num_edges (int): The number of edges in the graph.
+
+    Returns:
+        Dict[str, int]: The bytes allocated by each layout.
+    """
+    class LegacyVertex:
+        """The vertex layout before __slots__: a __dict__ and 3-tuple edges."""
+
+        def __init__(self, name):
+            self.name = name
+            self.children = {}
+
+    edges = _random_edges(num_vertices, num_edges)
+    results = {}
+
+    tracemalloc.start()
+    legacy: Dict[str, LegacyVertex] = {}
+    for u, v, w in edges:
+        for name in (u, v):
+            if name not in legacy:
+                legacy[name] = LegacyVertex(name)
+        legacy[u].children[v] = (u, v, w)
+    results["legacy_bytes"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del legacy
+
+    tracemalloc.start()
+    graph = Graph([])
+    for u, v, w in edges:
+        graph.add_edge(u, v, w)
+    results["compact_bytes"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del graph
+
+    return results
+
+
+def benchmark_landmarks(num_vertices: int = 100_000, num_edges: int = 500_000, k: int = 8,
+                        num_queries: int = 50) -> Dict[str, float]:
+    """
+    Reports the preprocessing cost and per-query speedup of ALT on a random graph.
+
+    Args:
+        num_vertices (int): The number of vertices in the graph.
+        num_edges (int): The number of edges in the graph.
+        k (int): The number of landmarks.
+        num_queries (int): The number of random route queries to time.
+
+    Returns:
+        Dict[str, float]: The figures from LandmarkIndex.report.
+    """
+    graph = Graph([])
+    for u, v, w in _random_edges(num_vertices, num_edges):
+        graph.add_edge(u, v, w)
+    index = graph.preprocess_landmarks(k)
+    rng = random.Random(1)
+    names = [vertex.name for vertex in graph.vertices]
+    queries = [(rng.choice(names), rng.choice(names)) for _ in range(num_queries)]
+    return index.report(graph, queries)
+
+
+def benchmark_bulk_load(num_vertices: int = 100_000, num_edges: int = 1_000_000) -> Dict[str, float]:
+    """
+    Measures the throughput of Graph.load_edges and Graph.export_edges on a
+    random graph, in edges per second, for both edge list formats.
+
+    Args:
+        num_vertices (int): The number of vertices in the graph.
+        num_edges (int): The number of edges in the graph.
+
+    Returns:
+        Dict[str, float]: Edges per second, keyed by operation and format.
+    """
+    graph = Graph([])
+    for u, v, w in _random_edges(num_vertices, num_edges):
+        graph.add_edge(u, v, w)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ("csv", "jsonl"):
+            path = os.path.join(directory, "edges." + fmt)
+            start = time.perf_counter()
+            count = graph.export_edges(path)
+            results["export_%s_edges_per_second" % fmt] = count / (time.perf_counter() - start)
+            start = time.perf_counter()
+            count = Graph([]).load_edges(path)
+            results["load_%s_edges_per_second" % fmt] = count / (time.perf_counter() - start)
+    return results
+
+
+class SyntheticProber:
+    """
+    A stub probe function over a generated network, for exercising sharded
+    discovery without real devices. Each device links to a few others chosen
+    by a hash of its name, and every probe burns a fixed amount of CPU to
+    stand in for parsing a real device's reply. Instances are picklable, so
+    they also work where worker processes are spawned.
+
+    Attributes:
+        num_devices (int): The number of devices in the network.
+        degree (int): The number of children of each device.
+        work (int): The number of hash rounds each probe spends.
+    """
+
+    def __init__(self, num_devices: int, degree: int = 4, work: int = 2_000):
+        """
+        Initializes a SyntheticProber.
+
+        Args:
+            num_devices (int): The number of devices in the network.
+            degree (int): The number of children of each device.
+            work (int): The number of hash rounds each probe spends.
+        """
+        self.num_devices = num_devices
+        self.degree = degree
+        self.work = work
+
+    def __call__(self, path: List[str]) -> List[Tuple[str, str, float]]:
+        """
+        Probes the last device in path.
+
+        Args:
+            path (List[str]): The sequence of device names leading to the device.
+
+        Returns:
+            List[Tuple[str, str, float]]: The edges from the device to its children.
+        """
+        name = path[-1]
+        digest = zlib.crc32(name.encode("utf-8"))
+        for _ in range(self.work):
+            digest = zlib.crc32(digest.to_bytes(4, "little"), digest)
+        edges = []
+        for i in range(self.degree):
+            seed = zlib.crc32(b"%s/%d" % (name.encode("utf-8"), i))
+            edges.append((name, "device-%d" % (seed % self.num_devices), float(seed % 100 + 1)))
+        return edges
+
+
+def benchmark_sharded(num_devices: int = 20_000, shard_counts: Iterable[int] = (1, 2, 4),
+                      work: int = 2_000) -> Dict[int, float]:
+    """
+    Times sharded discovery of a SyntheticProber network for several shard
+    counts, next to the serial crawl (reported under 0 shards).
+
+    Args:
+        num_devices (int): The number of devices in the network.
+        shard_counts (Iterable[int]): The shard counts to time.
+        work (int): The number of hash rounds each probe spends.
+
+    Returns:
+        Dict[int, float]: The seconds each crawl took, by shard count.
+    """
+    prober = SyntheticProber(num_devices, work=work)
+    results = {}
+    start = time.perf_counter()
+    Device("device-0").discover_network(prober)
+    results[0] = time.perf_counter() - start
+    for num_shards in shard_counts:
+        start = time.perf_counter()
+        Device("device-0").discover_sharded(prober, num_shards)
+        results[num_shards] = time.perf_counter() - start
+    return results
+
+
+# ----------------------------------------------------------------------
+# Mock function for testing
+# ----------------------------------------------------------------------
+def find_devices_fn(path: List[str]) -> List[Tuple[str, str, float]]:
+    """
+    A mock function that simulates network discovery.
+
+    Args:
+        path (List[str]): The sequence of device names representing the discovery path.
+
+    Returns:
+        List[Tuple[str, str, float]]: A list of edges, where each tuple contains:
+            - source device name (str),
+            - child device name (str),
+            - edge weight (float).
+    """
+    if not path:
+        return []
+
+    last_device = path[-1]
+
+    mock_network = {
+        "chandra-s25": [
+            ("chandra-s25", "router-051797", 1.0),
+            ("chandra-s25", "helen-pc", 2.0),
+        ],
+        "router-051797": [
+            ("router-051797", "ws-102", 1.2),
+            ("router-051797", "switch-12", 0.8),
+            ("router-051797", "srv-07", 1.0),
+        ],
+        "helen-pc": [
+            ("helen-pc", "ws-14", 1.5),
+        ],
+    }
+
+    return mock_network.get(last_device, [])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["bench-memory"]:
+        for key, value in benchmark_memory().items():
+            print("%s: %.1f MB" % (key, value / 1e6))
+    elif sys.argv[1:] == ["bench-landmarks"]:
+        for key, value in benchmark_landmarks().items():
+            print("%s: %s" % (key, value))
+    elif sys.argv[1:] == ["bench-load"]:
+        for key, value in benchmark_bulk_load().items():
+            print("%s: %.0f" % (key, value))
+    elif sys.argv[1:] == ["bench-sharded"]:
+        print("cores: %d" % (os.cpu_count() or 1))
+        for num_shards, seconds in benchmark_sharded().items():
+            print("%d shards: %.2f s" % (num_shards, seconds))
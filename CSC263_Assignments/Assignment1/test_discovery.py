@@ -0,0 +1,436 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+_spec = importlib.util.spec_from_file_location(
+    "a1_soln", os.path.join(os.path.dirname(os.path.abspath(__file__)), "csc263-a1-student-soln.py"))
+a1 = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = a1
+_spec.loader.exec_module(a1)
+
+# The tests hand lambdas to the workers, so they need fork where it exists.
+START_METHOD = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+
+
+def mesh(n):
+    """A complete mesh of n devices: every device links to every other one."""
+    names = ["d%d" % i for i in range(n)]
+    return {u: [(u, v, float(1 + (i * j) % 7)) for j, v in enumerate(names) if v != u]
+            for i, u in enumerate(names)}
+
+
+def prober(network, calls=None):
+    """A find_devices_fn over network that counts its calls by device."""
+    def find_devices(path):
+        if calls is not None:
+            calls[path[-1]] = calls.get(path[-1], 0) + 1
+        return network.get(path[-1], [])
+    return find_devices
+
+
+def edges(graph):
+    """Every edge of graph, sorted."""
+    return sorted((vertex.name, v, w) for vertex in graph.vertices for v, w in vertex.weights.items())
+
+
+class ExactlyOnceTest(unittest.TestCase):
+    """Every discovery mode probes each reachable device exactly once."""
+
+    def setUp(self):
+        self.network = mesh(15)
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def find_devices(self, path):
+        with self.lock:
+            self.calls[path[-1]] = self.calls.get(path[-1], 0) + 1
+        return self.network[path[-1]]
+
+    async def find_devices_async(self, path):
+        return self.find_devices(path)
+
+    def assert_probed_once(self, probes):
+        self.assertEqual(self.calls, {name: 1 for name in self.network})
+        self.assertEqual(probes, len(self.network))
+
+    def test_serial(self):
+        device = a1.Device("d0")
+        self.assert_probed_once(device.discover_network(self.find_devices))
+        self.assertEqual(device.probed, set(self.network))
+
+    def test_threaded(self):
+        self.assert_probed_once(a1.Device("d0").discover_network(self.find_devices, max_workers=4))
+
+    def test_async(self):
+        self.assert_probed_once(asyncio.run(a1.Device("d0").discover_network_async(self.find_devices_async, 4)))
+
+    def test_modes_build_the_same_graph(self):
+        serial = a1.Device("d0")
+        serial.discover_network(self.find_devices)
+        threaded = a1.Device("d0")
+        threaded.discover_network(self.find_devices, max_workers=4)
+        asynchronous = a1.Device("d0")
+        asyncio.run(asynchronous.discover_network_async(self.find_devices_async, 4))
+        expected = sum(len(edges) for edges in self.network.values())
+        self.assertEqual(len(edges(serial.network)), expected)
+        self.assertEqual(edges(threaded.network), edges(serial.network))
+        self.assertEqual(edges(asynchronous.network), edges(serial.network))
+        for target in self.network:
+            self.assertEqual(threaded.find_path(target), serial.find_path(target))
+
+
+class ThreadedDiscoveryTest(unittest.TestCase):
+    """Thread-pool discovery against a probe stub that sleeps like network I/O."""
+
+    def test_sleeping_probes_overlap(self):
+        network = mesh(12)
+
+        def find_devices(path):
+            time.sleep(0.02)
+            return network[path[-1]]
+
+        start = time.monotonic()
+        serial = a1.Device("d0")
+        serial.discover_network(find_devices)
+        serial_seconds = time.monotonic() - start
+
+        start = time.monotonic()
+        threaded = a1.Device("d0")
+        self.assertEqual(threaded.discover_network(find_devices, max_workers=12), len(network))
+        threaded_seconds = time.monotonic() - start
+
+        self.assertEqual(edges(threaded.network), edges(serial.network))
+        # 12 sleeps in a row against two levels of overlapping ones.
+        self.assertLess(threaded_seconds, serial_seconds / 2)
+
+
+def random_network(n, num_edges, rng):
+    """A random network of n devices d0..d{n - 1} for prober."""
+    network = {"d%d" % i: [] for i in range(n)}
+    for _ in range(num_edges):
+        u, v = "d%d" % rng.randrange(n), "d%d" % rng.randrange(n)
+        network[u].append((u, v, float(rng.randint(1, 5))))
+    return network
+
+
+class BoundedDiscoveryTest(unittest.TestCase):
+    """discover_network with max_hops and max_cost."""
+
+    def test_max_hops(self):
+        for seed in range(20):
+            network = random_network(40, 70, random.Random(seed))
+            hops = {"d0": 0}
+            level = ["d0"]
+            while level:
+                next_level = []
+                for u in level:
+                    for _, v, _ in network[u]:
+                        if v not in hops:
+                            hops[v] = hops[u] + 1
+                            next_level.append(v)
+                level = next_level
+            for max_hops in range(4):
+                expected = {name: 1 for name, h in hops.items() if h <= max_hops}
+                for max_workers in (None, 4):
+                    calls = {}
+                    device = a1.Device("d0")
+                    probes = device.discover_network(prober(network, calls), max_workers=max_workers,
+                                                     max_hops=max_hops)
+                    self.assertEqual(calls, expected, (seed, max_hops, max_workers))
+                    self.assertEqual(probes, len(expected))
+
+    def test_max_cost(self):
+        for seed in range(20):
+            network = random_network(40, 70, random.Random(seed))
+            cost, _ = a1.cheapest_first_search("d0", lambda name: [(v, w) for _, v, w in network[name]])
+            for max_cost in (0.0, 2.0, 4.5, 7.0):
+                calls = {}
+                device = a1.Device("d0")
+                probes = device.discover_network(prober(network, calls), max_cost=max_cost)
+                expected = {name: 1 for name, c in cost.items() if c <= max_cost}
+                self.assertEqual(calls, expected, (seed, max_cost))
+                self.assertEqual(probes, len(expected))
+
+
+class RediscoverTest(unittest.TestCase):
+    """Device.rediscover."""
+
+    def test_dirty_devices_bypass_the_probe_cache(self):
+        network = {"a": [("a", "b", 1.0)], "b": [("b", "c", 1.0)], "c": []}
+        cache = a1.ProbeCache(prober(network), ttl=3600)
+        device = a1.Device("a")
+        device.discover_network(cache)
+        network["b"] = [("b", "c", 4.0)]
+        diff = device.rediscover(cache, ["b"])
+        self.assertEqual(diff.changed_edges, [(("b", "c", 1.0), ("b", "c", 4.0))])
+        self.assertEqual(device.network.get_edge("b", "c"), ("b", "c", 4.0))
+
+
+class ProbeCacheTest(unittest.TestCase):
+    """ProbeCache."""
+
+    def setUp(self):
+        self.network = {"a": [("a", "b", 1.0)], "b": [("b", "c", 2.0)], "c": []}
+        self.calls = {}
+
+    def test_hits_and_misses(self):
+        cache = a1.ProbeCache(prober(self.network, self.calls))
+        for name in ("a", "b", "a", "a", "c"):
+            self.assertEqual(cache([name]), self.network[name])
+        self.assertEqual(self.calls, {"a": 1, "b": 1, "c": 1})
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+    def test_ttl_expiry(self):
+        cache = a1.ProbeCache(prober(self.network, self.calls), ttl=10)
+        with mock.patch.object(a1.time, "time", return_value=1000.0):
+            cache(["a"])
+        with mock.patch.object(a1.time, "time", return_value=1010.0):
+            cache(["a"])
+        self.assertEqual(self.calls, {"a": 1})
+        with mock.patch.object(a1.time, "time", return_value=1010.5):
+            cache(["a"])
+        self.assertEqual(self.calls, {"a": 2})
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction(self):
+        cache = a1.ProbeCache(prober(self.network, self.calls), max_size=2)
+        cache(["a"])
+        cache(["b"])
+        cache(["a"])
+        cache(["c"])
+        self.assertEqual(len(cache), 2)
+        cache(["a"])
+        self.assertEqual(self.calls, {"a": 1, "b": 1, "c": 1})
+        cache(["b"])
+        self.assertEqual(self.calls, {"a": 1, "b": 2, "c": 1})
+
+    def test_save_and_reload(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "probes.json")
+            cache = a1.ProbeCache(prober(self.network, self.calls), ttl=3600, path=path)
+            a1.Device("a").discover_network(cache)
+            cache.save()
+
+            reloaded = a1.ProbeCache(prober(self.network, self.calls), ttl=3600, path=path)
+            self.assertEqual(len(reloaded), 3)
+            device = a1.Device("a")
+            device.discover_network(reloaded)
+            self.assertEqual(self.calls, {"a": 1, "b": 1, "c": 1})
+            self.assertEqual((reloaded.hits, reloaded.misses), (3, 0))
+            self.assertEqual(edges(device.network), [("a", "b", 1.0), ("b", "c", 2.0)])
+
+
+class AsyncDiscoveryTest(unittest.TestCase):
+    """Device.discover_network_async."""
+
+    def test_needs_a_probe_slot(self):
+        async def find_devices(path):
+            return []
+
+        with self.assertRaises(ValueError):
+            asyncio.run(a1.Device("d0").discover_network_async(find_devices, max_concurrency=0))
+
+
+class FakeClock:
+    """A clock for TokenBucket and ProbeScheduler that only moves when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class LazyFindPathTest(unittest.TestCase):
+    """Device.find_path with a find_devices_fn, against eager discovery."""
+
+    def test_matches_eager_discovery(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            network = random_network(30, 60, rng)
+            eager = a1.Device("d0")
+            eager.discover_network(prober(network))
+            calls = {}
+            lazy = a1.Device("d0")
+            targets = ["d%d" % i for i in range(31)]
+            rng.shuffle(targets)
+            for target in targets:
+                self.assertEqual(lazy.find_path(target, find_devices_fn=prober(network, calls)),
+                                 eager.find_path(target), (seed, target))
+                self.assertLessEqual(max(calls.values()), 1)
+            self.assertEqual(set(calls), eager.probed)
+
+
+class IterDiscoverTest(unittest.TestCase):
+    """Device.iter_discover stopped part of the way through."""
+
+    def test_early_stop_leaves_a_consistent_graph(self):
+        network = random_network(30, 60, random.Random(7))
+        full = list(a1.Device("d0").iter_discover(prober(network)))
+        for stop in range(len(full) + 1):
+            calls = {}
+            device = a1.Device("d0")
+            crawl = device.iter_discover(prober(network, calls))
+            yielded = [next(crawl) for _ in range(stop)]
+            crawl.close()
+            self.assertEqual(yielded, full[:stop])
+            probed = {name for name, _ in yielded}
+            self.assertEqual(calls, {name: 1 for name in probed})
+            self.assertEqual(device.probed, probed)
+            # A device listed twice in one probe keeps the later weight.
+            expected = {(u, v): w for _, found in yielded for u, v, w in found}
+            self.assertEqual(edges(device.network), sorted((u, v, w) for (u, v), w in expected.items()))
+            for vertex in device.network.vertices:
+                parents = sorted((u, w) for u, v, w in edges(device.network) if v == vertex.name)
+                self.assertEqual(sorted(device.network.reverse_neighbours(vertex.name)), parents)
+
+
+class ProbeSchedulerTest(unittest.TestCase):
+    """ProbeScheduler and TokenBucket."""
+
+    def setUp(self):
+        # b is first found at cost 5, then more cheaply through c and d.
+        self.network = {"a": [("a", "b", 5.0), ("a", "c", 1.0)], "b": [("b", "e", 1.0)],
+                        "c": [("c", "d", 1.0)], "d": [("d", "b", 1.0)], "e": []}
+        self.clock = FakeClock()
+        self.order = []
+
+    def find_devices(self, path):
+        self.order.append(path[-1])
+        return self.network[path[-1]]
+
+    def scheduler(self, **kwargs):
+        return a1.ProbeScheduler(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_one_worker_probes_cheapest_first(self):
+        device = a1.Device("a")
+        self.assertEqual(device.discover_network(self.find_devices, scheduler=self.scheduler()), 5)
+        self.assertEqual(self.order, ["a", "c", "d", "b", "e"])
+        self.assertEqual(device.find_path("e"), ["a", "c", "d", "b", "e"])
+
+    def test_retries_back_off(self):
+        failures = {"c": 2}
+
+        def find_devices(path):
+            if failures.get(path[-1]):
+                failures[path[-1]] -= 1
+                raise OSError("timeout")
+            return self.find_devices(path)
+
+        scheduler = self.scheduler(backoff=0.5)
+        self.assertEqual(a1.Device("a").discover_network(find_devices, scheduler=scheduler), 5)
+        self.assertEqual((scheduler.attempts, scheduler.retries), (7, 2))
+        self.assertEqual(self.clock.sleeps, [0.5, 1.0])
+        self.assertEqual(scheduler.failed, {})
+
+    def test_exhausted_retries_are_recorded(self):
+        def find_devices(path):
+            if path[-1] == "c":
+                raise OSError("unreachable")
+            return self.find_devices(path)
+
+        scheduler = self.scheduler(max_retries=1, backoff=0.5)
+        device = a1.Device("a")
+        self.assertEqual(device.discover_network(find_devices, scheduler=scheduler), 3)
+        self.assertEqual(list(scheduler.failed), ["c"])
+        self.assertIsInstance(scheduler.failed["c"], OSError)
+        self.assertEqual((scheduler.attempts, scheduler.retries), (5, 1))
+        self.assertEqual(self.order, ["a", "b", "e"])
+        self.assertNotIn("c", device.probed)
+
+    def test_rate_limits(self):
+        scheduler = self.scheduler(rate=2.0)
+        a1.Device("a").discover_network(self.find_devices, scheduler=scheduler)
+        # The first probe uses the full bucket, the other four wait half a second each.
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+        self.clock = FakeClock()
+        scheduler = self.scheduler(subnet_rate=1.0, subnet_fn=lambda name: "one subnet")
+        a1.Device("a").discover_network(self.find_devices, scheduler=scheduler)
+        self.assertAlmostEqual(self.clock.now, 4.0)
+
+    def test_invalid_rates(self):
+        for rate, burst in ((0.0, 1.0), (-1.0, 1.0), (1.0, 0.5)):
+            with self.assertRaises(ValueError):
+                a1.TokenBucket(rate, burst)
+            with self.assertRaises(ValueError):
+                a1.ProbeScheduler(rate=rate, burst=burst)
+            with self.assertRaises(ValueError):
+                a1.ProbeScheduler(subnet_rate=rate, subnet_burst=burst)
+
+
+class ShardedDiscoveryTest(unittest.TestCase):
+    """Device.discover_sharded."""
+
+    @unittest.skipIf(START_METHOD is None, "needs the fork start method")
+    def test_matches_serial_discovery(self):
+        network = mesh(12)
+        serial = a1.Device("d0")
+        serial.discover_network(prober(network))
+        sharded = a1.Device("d0")
+        self.assertEqual(sharded.discover_sharded(prober(network), 3, start_method=START_METHOD), 12)
+        self.assertEqual(edges(sharded.network), edges(serial.network))
+
+    @unittest.skipIf(START_METHOD is None, "needs the fork start method")
+    def test_dead_worker_is_reported(self):
+        network = mesh(6)
+
+        def find_devices(path):
+            if path[-1] == "d3":
+                os._exit(3)
+            return network.get(path[-1], [])
+
+        start = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            a1.Device("d0").discover_sharded(find_devices, 2, start_method=START_METHOD)
+        self.assertLess(time.monotonic() - start, 5.0)
+
+
+class TopologyStoreTest(unittest.TestCase):
+    """Probe deduplication across devices attached to one TopologyStore."""
+
+    def test_async_discovery_probes_each_device_once(self):
+        network = mesh(8)
+        calls = {}
+
+        async def find_devices(path):
+            calls[path[-1]] = calls.get(path[-1], 0) + 1
+            await asyncio.sleep(0.001)
+            return network[path[-1]]
+
+        store = a1.TopologyStore()
+        first, second = a1.Device("d0", store=store), a1.Device("d5", store=store)
+
+        async def discover():
+            await asyncio.gather(first.discover_network_async(find_devices),
+                                 second.discover_network_async(find_devices))
+
+        asyncio.run(discover())
+        self.assertEqual(calls, {name: 1 for name in network})
+        self.assertEqual(store.probes, len(network))
+
+    @unittest.skipIf(START_METHOD is None, "needs the fork start method")
+    def test_sharded_discovery_skips_probed_devices(self):
+        network = mesh(8)
+        store = a1.TopologyStore()
+        a1.Device("d0", store=store).discover_network(prober(network))
+        self.assertEqual(a1.Device("d5", store=store).discover_sharded(prober(network), 2,
+                                                                       start_method=START_METHOD), 0)
+        self.assertEqual(store.probes, len(network))
+
+
+if __name__ == "__main__":
+    unittest.main()
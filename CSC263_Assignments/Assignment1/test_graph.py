@@ -0,0 +1,412 @@
+import importlib.util
+import math
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+_spec = importlib.util.spec_from_file_location(
+    "a1_soln", os.path.join(os.path.dirname(os.path.abspath(__file__)), "csc263-a1-student-soln.py"))
+a1 = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = a1
+_spec.loader.exec_module(a1)
+
+
+def brute_parents(graph, name):
+    """Scans every edge of graph for the (parent, weight) pairs into name."""
+    return sorted((vertex.name, vertex.weights[name]) for vertex in graph.vertices if name in vertex.weights)
+
+
+class ReverseIndexTest(unittest.TestCase):
+    """Graph's reverse adjacency index against a full scan of the edges."""
+
+    def test_random_edits(self):
+        rng = random.Random(3)
+        names = ["x%d" % i for i in range(25)] + ["a", "b"]
+        for trial in range(30):
+            graph = a1.Graph([a1.Vertex("a", {"b": ("a", "b", 1.0)}), a1.Vertex("b")])
+            for step in range(400):
+                op = rng.random()
+                u, v = rng.choice(names), rng.choice(names)
+                if op < 0.5:
+                    graph.add_edge(u, v, float(rng.randint(1, 5)))
+                elif op < 0.7:
+                    if graph.is_child(u, v):
+                        graph.update_edge(u, v, float(rng.randint(1, 5)))
+                elif op < 0.9:
+                    graph.remove_edge(u, v)
+                elif op < 0.95:
+                    graph.remove_vertices(rng.sample(names, 2))
+                else:
+                    graph.vertices.append(a1.Vertex("y%d" % step, {"a": ("y%d" % step, "a", 2.0)}))
+
+                if step % 20 == 0:
+                    for name in names + ["missing"]:
+                        expected = brute_parents(graph, name)
+                        self.assertEqual(sorted(graph.reverse_neighbours(name)), expected, (trial, step, name))
+                        self.assertEqual(sorted(graph.parents(name)), [(u, name, w) for u, w in expected])
+                        self.assertEqual(graph.in_degree(name), len(expected))
+                        vertex = graph.get_vertex(name)
+                        self.assertEqual(graph.out_degree(name), 0 if vertex is None else len(vertex.weights))
+
+    def test_edges_outside_the_index_can_be_updated_and_removed(self):
+        graph = a1.Graph([a1.Vertex("a"), a1.Vertex("b")])
+        graph.get_vertex("a").weights["b"] = 2.0
+        self.assertEqual(graph.update_edge("a", "b", 3.0), ("a", "b", 2.0))
+        self.assertEqual(graph.remove_edge("a", "b"), ("a", "b", 3.0))
+        self.assertIsNone(graph.remove_edge("a", "b"))
+
+
+class IndexTest(unittest.TestCase):
+    """Graph's name index."""
+
+    def test_duplicate_names_do_not_reindex_on_every_lookup(self):
+        graph = a1.Graph([a1.Vertex("a"), a1.Vertex("a"), a1.Vertex("b")])
+        version = graph.version
+        for _ in range(5):
+            self.assertIsNotNone(graph.get_vertex("a"))
+        self.assertEqual(graph.version, version)
+        graph.vertices.append(a1.Vertex("c"))
+        self.assertIsNotNone(graph.get_vertex("c"))
+        self.assertEqual(graph.version, version + 1)
+        graph.get_vertex("c")
+        self.assertEqual(graph.version, version + 1)
+
+
+def random_network(num_vertices, num_edges, rng, max_weight):
+    """A random graph on n0..n{num_vertices - 1}."""
+    graph = a1.Graph([a1.Vertex("n0")])
+    for _ in range(num_edges):
+        graph.add_edge("n%d" % rng.randrange(num_vertices), "n%d" % rng.randrange(num_vertices),
+                       float(rng.randint(1, max_weight)))
+    return graph
+
+
+def legacy_find_path(graph, source, target):
+    """The list-scanning Cheapest-First Search find_path used to run, kept as a reference."""
+    open_list = [([source], 0.0)]
+    cheapest_cost = {}
+    while open_list:
+        least_path, least_cost = open_list[0]
+        for path, cost in open_list:
+            if cost < least_cost:
+                least_path, least_cost = path, cost
+        open_list.remove((least_path, least_cost))
+        current = least_path[-1]
+        if current in cheapest_cost and cheapest_cost[current] <= least_cost:
+            continue
+        cheapest_cost[current] = least_cost
+        if current == target:
+            return least_path
+        vertex = graph.get_vertex(current)
+        if vertex is None:
+            continue
+        for child_name, (_, _, weight) in vertex.children.items():
+            new_cost = least_cost + weight
+            if child_name not in cheapest_cost or new_cost < cheapest_cost[child_name]:
+                open_list.append((least_path + [child_name], new_cost))
+    return None
+
+
+class LegacySearchTest(unittest.TestCase):
+    """Device.find_path against the list-scanning search it replaced."""
+
+    def test_same_paths_including_ties(self):
+        for seed in range(350):
+            rng = random.Random(seed)
+            # Few distinct weights, so many paths tie for cheapest.
+            graph = random_network(12, rng.randint(5, 40), rng, rng.choice([1, 2, 3]))
+            device = a1.Device("n0")
+            device.network = graph
+            for target in ["n%d" % i for i in range(13)]:
+                self.assertEqual(device.find_path(target), legacy_find_path(graph, "n0", target), (seed, target))
+
+
+def path_cost(graph, path):
+    """The total weight of path in graph, or None for no path."""
+    if path is None:
+        return None
+    return sum(graph.get_edge(a, b)[2] for a, b in zip(path, path[1:]))
+
+
+class FindPathsTest(unittest.TestCase):
+    """Device.find_paths and Device.shortest_path_tree against find_path."""
+
+    def test_matches_find_path(self):
+        for seed in range(60):
+            rng = random.Random(seed)
+            graph = random_network(20, 50, rng, 3)
+            device = a1.Device("n0")
+            device.network = graph
+            targets = rng.sample(["n%d" % i for i in range(21)], rng.randint(1, 8))
+            for path_cache in (None, a1.PathCache()):
+                graph.path_cache = path_cache
+                paths = device.find_paths(targets)
+                self.assertEqual(sorted(paths), sorted(set(targets)))
+                for target in targets:
+                    expected = device.find_path(target)
+                    if expected is None:
+                        self.assertIsNone(paths[target], (seed, target))
+                    else:
+                        self.assertEqual(paths[target], (expected, path_cost(graph, expected)), (seed, target))
+                    self.assertEqual(device.shortest_path_tree().path_to(target), expected)
+
+
+class TreeRepairTest(unittest.TestCase):
+    """Cached shortest path trees repaired in place against a fresh search."""
+
+    def test_random_edits_match_recomputation(self):
+        for seed in range(300):
+            rng = random.Random(seed)
+            graph = random_network(25, 70, rng, 4)
+            graph.path_cache = a1.PathCache(8)
+            tree = graph.shortest_path_tree("n0")
+            for step in range(40):
+                u, v = "n%d" % rng.randrange(27), "n%d" % rng.randrange(27)
+                op = rng.random()
+                if op < 0.35:
+                    graph.add_edge(u, v, float(rng.randint(1, 4)))
+                elif op < 0.6:
+                    if graph.is_child(u, v):
+                        graph.update_edge(u, v, float(rng.randint(1, 6)))
+                elif op < 0.9:
+                    vertex = graph.get_vertex(u)
+                    if vertex is not None and vertex.weights:
+                        graph.remove_edge(u, rng.choice(list(vertex.weights)))
+                else:
+                    graph.add_vertex(a1.Vertex("x%d" % step))
+
+                self.assertIs(graph.shortest_path_tree("n0"), tree, (seed, step))
+                cost, _ = a1.cheapest_first_search("n0", graph.neighbours)
+                self.assertEqual(tree.cost, cost, (seed, step))
+                for name in tree.cost:
+                    path = tree.path_to(name)
+                    self.assertEqual(path[0], "n0")
+                    self.assertEqual(sum(graph.get_edge(a, b)[2] for a, b in zip(path, path[1:])),
+                                     tree.cost[name], (seed, step, name))
+
+    def test_update_of_a_missing_edge_raises(self):
+        graph = a1.Graph([a1.Vertex("a")])
+        with self.assertRaises(KeyError):
+            graph.update_edge("a", "b", 1.0)
+
+
+class LandmarkTest(unittest.TestCase):
+    """ALT route queries against plain Cheapest-First Search."""
+
+    def test_alt_matches_dijkstra(self):
+        for seed in range(40):
+            rng = random.Random(seed)
+            graph = random_network(30, 90, rng, 9)
+            graph.vertices.append(a1.Vertex("n0"))
+            graph.preprocess_landmarks(4)
+            device = a1.Device("n0")
+            device.network = graph
+            for target in ["n%d" % i for i in range(31)]:
+                expected = path_cost(graph, device.find_path(target))
+                self.assertEqual(path_cost(graph, device.find_path(target, strategy="alt")), expected,
+                                 (seed, target))
+
+    def test_duplicate_names(self):
+        graph = a1.Graph([a1.Vertex("a", {"b": ("a", "b", 1.0)}), a1.Vertex("a"),
+                          a1.Vertex("b", {"c": ("b", "c", 2.0)}), a1.Vertex("c")])
+        index = graph.preprocess_landmarks(2)
+        self.assertLessEqual(index.heuristic("a", "c"), 3.0)
+
+
+class StrategyTest(unittest.TestCase):
+    """Device.find_path strategies against cheapest_first_search."""
+
+    def test_strategies_match_dijkstra(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            names = ["n%d" % i for i in range(25)]
+            coordinates = {name: (rng.uniform(0, 10), rng.uniform(0, 10)) for name in names}
+            graph = a1.Graph([a1.Vertex("n0")])
+            for _ in range(70):
+                u, v = rng.choice(names), rng.choice(names)
+                (x1, y1), (x2, y2) = coordinates[u], coordinates[v]
+                graph.add_edge(u, v, float(math.ceil(math.hypot(x1 - x2, y1 - y2)) + rng.randint(0, 3)))
+            graph.preprocess_landmarks(3)
+            device = a1.Device("n0")
+            device.network = graph
+            cost, _ = a1.cheapest_first_search("n0", graph.neighbours)
+            strategies = [("dijkstra", None), ("bidirectional", None), ("alt", None),
+                          ("astar", a1.coordinate_heuristic(coordinates)), ("astar", a1.hop_heuristic(graph))]
+            for target in names:
+                expected = a1.cheapest_first_search("n0", graph.neighbours, [target])[0]
+                for strategy, heuristic in strategies:
+                    path = device.find_path(target, strategy=strategy, heuristic=heuristic)
+                    self.assertEqual(path_cost(graph, path), cost.get(target), (seed, target, strategy))
+                    if path is not None:
+                        self.assertEqual((path[0], path[-1]), ("n0", target))
+                    if strategy == "dijkstra":
+                        self.assertEqual(device.settled, len(expected))
+                    else:
+                        self.assertLessEqual(device.settled, 2 * len(graph.vertices))
+                        self.assertGreater(device.settled, 0)
+
+    def test_settled_is_zero_for_answers_without_a_search(self):
+        device = a1.Device("a")
+        device.network.add_edge("a", "b", 1.0)
+        device.network.ensure_vertex("c")
+        device.network.reachability()
+        self.assertIsNone(device.find_path("c"))
+        self.assertEqual(device.settled, 0)
+        device.network.path_cache = a1.PathCache()
+        self.assertEqual(device.find_path("b"), ["a", "b"])
+        self.assertEqual(device.settled, 0)
+
+
+class FreezeTest(unittest.TestCase):
+    """Graph.freeze."""
+
+    def test_matches_the_graph(self):
+        graph = random_network(30, 90, random.Random(4), 9)
+        graph.vertices.append(a1.Vertex("z", {"n0": ("z", "n0", 1.0)}))
+        frozen = graph.freeze()
+        for vertex in graph.vertices:
+            self.assertEqual(frozen.neighbours(vertex.name), graph.neighbours(vertex.name))
+            self.assertEqual(path_cost(frozen, frozen.find_path("z", vertex.name)),
+                             a1.cheapest_first_search("z", graph.neighbours)[0].get(vertex.name))
+
+
+class ContractionTest(unittest.TestCase):
+    """ContractionHierarchy route queries."""
+
+    def test_cross_check_all_pairs(self):
+        for seed in range(40):
+            rng = random.Random(seed)
+            graph = a1.Graph([a1.Vertex("n0")])
+            for _ in range(60):
+                u, v = "n%d" % rng.randrange(20), "n%d" % rng.randrange(20)
+                # Zero weights, and edges added again with a new weight.
+                graph.add_edge(u, v, float(rng.choice([0, 0, 1, 2, 3])))
+                if rng.random() < 0.2:
+                    graph.add_edge(u, v, float(rng.randint(0, 3)))
+            hierarchy = a1.ContractionHierarchy(graph)
+            names = ["n%d" % i for i in range(21)]
+            report = hierarchy.cross_check(graph, [(u, v) for u in names for v in names])
+            self.assertEqual(report["mismatches"], [], seed)
+
+    def test_duplicate_names(self):
+        graph = a1.Graph([a1.Vertex("a"), a1.Vertex("a", {"b": ("a", "b", 1.0)}), a1.Vertex("b")])
+        self.assertIsNone(a1.ContractionHierarchy(graph).find_path("a", "b"))
+
+
+class ReachabilityTest(unittest.TestCase):
+    """ReachabilityIndex against Cheapest-First Search."""
+
+    def test_matches_search(self):
+        for seed in range(30):
+            graph = random_network(30, 45, random.Random(seed), 3)
+            index = graph.reachability()
+            names = ["n%d" % i for i in range(31)]
+            for u in names:
+                reached = a1.cheapest_first_search(u, graph.neighbours)[0]
+                for v in names:
+                    self.assertEqual(index.is_reachable(u, v), v in reached, (seed, u, v))
+
+    def test_duplicate_names(self):
+        graph = a1.Graph([a1.Vertex("a"), a1.Vertex("a", {"b": ("a", "b", 1.0)}), a1.Vertex("b")])
+        self.assertIsNone(graph.get_edge("a", "b"))
+        self.assertFalse(graph.reachability().is_reachable("a", "b"))
+
+
+class SnapshotTest(unittest.TestCase):
+    """Graph.save_snapshot and MappedGraph."""
+
+    def test_mapped_graph_matches_frozen_graph(self):
+        graph = random_network(40, 150, random.Random(2), 9)
+        frozen = graph.freeze()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "graph.snap")
+            graph.save_snapshot(path)
+            with a1.MappedGraph(path) as mapped:
+                self.assertEqual(sorted(mapped.names), sorted(frozen.names))
+                self.assertEqual(mapped.ids, {name: mapped.vertex_id(name) for name in mapped.names})
+                for name in frozen.names:
+                    self.assertEqual(sorted(mapped.neighbours(name)), sorted(frozen.neighbours(name)))
+
+
+class EdgeViewTest(unittest.TestCase):
+    """Edges written through Vertex.children on a vertex that is in a graph."""
+
+    def test_writes_reach_the_reverse_index(self):
+        device = a1.Device("a")
+        device.network.ensure_vertex("b")
+        device.children["b"] = ("a", "b", 2.0)
+        self.assertEqual(device.network.parents("b"), [("a", "b", 2.0)])
+        self.assertEqual(device.network.in_degree("b"), 1)
+        self.assertEqual(device.network.update_edge("a", "b", 3.0), ("a", "b", 2.0))
+        del device.children["b"]
+        self.assertEqual(device.network.in_degree("b"), 0)
+        self.assertIsNone(device.network.remove_edge("a", "b"))
+        with self.assertRaises(KeyError):
+            del device.children["b"]
+
+    def test_writes_repair_cached_routes(self):
+        device = a1.Device("a")
+        device.network.path_cache = a1.PathCache()
+        device.network.add_edge("a", "b", 5.0)
+        self.assertEqual(device.find_path("b"), ["a", "b"])
+        device.children["c"] = ("a", "c", 1.0)
+        device.network.get_vertex("c").children = {"b": ("c", "b", 1.0)}
+        self.assertEqual(device.find_path("b"), ["a", "c", "b"])
+        del device.children["c"]
+        self.assertEqual(device.find_path("b"), ["a", "b"])
+
+
+class EdgeListTest(unittest.TestCase):
+    """Graph.load_edges and Graph.export_edges."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_round_trip(self):
+        graph = a1.Graph([])
+        rng = random.Random(5)
+        names = ["a", "b,c", 'q"x', "\u00fc", "n 1", "[x]"]
+        for _ in range(200):
+            graph.add_edge(rng.choice(names), rng.choice(names), rng.choice([1.5, 0.1 + 0.2, float("inf"), 3]))
+        expected = sorted((vertex.name, v, w) for vertex in graph.vertices for v, w in vertex.weights.items())
+        for fmt in ("csv", "jsonl"):
+            path = os.path.join(self.directory.name, "edges." + fmt)
+            self.assertEqual(graph.export_edges(path), len(expected))
+            loaded = a1.Graph([])
+            self.assertEqual(loaded.load_edges(path), len(expected))
+            self.assertEqual(sorted((vertex.name, v, w) for vertex in loaded.vertices
+                                    for v, w in vertex.weights.items()), expected)
+            for name in names:
+                self.assertEqual(sorted(loaded.reverse_neighbours(name)), sorted(graph.reverse_neighbours(name)))
+
+    def test_sources_get_no_reverse_index_entry(self):
+        graph = a1.Graph([])
+        graph.load_edges(self.write("e.csv", "a,b,1\nb,c,2\n"))
+        self.assertEqual(sorted(graph._parents), ["b", "c"])
+
+    def test_csv_header(self):
+        graph = a1.Graph([])
+        self.assertEqual(graph.load_edges(self.write("h.csv", "source,target,weight\na,b,2\n")), 1)
+        with self.assertRaisesRegex(ValueError, r"\.csv:1: "):
+            a1.Graph([]).load_edges(self.write("bad.csv", "a,b,oops\nb,c,2\n"))
+
+    def test_errors_give_the_file_line(self):
+        path = self.write("bad.jsonl", '["a", "b", 1]\n\n["b", "c", 2]\n["c",\n')
+        with self.assertRaisesRegex(ValueError, r"\.jsonl:4: "):
+            a1.Graph([]).load_edges(path)
+        path = self.write("bad2.jsonl", '["a", "b", 1]\n\n{"source": "c"}\n')
+        with self.assertRaisesRegex(ValueError, r"\.jsonl:3: "):
+            a1.Graph([]).load_edges(path)
+
+
+if __name__ == "__main__":
+    unittest.main()